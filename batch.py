@@ -0,0 +1,119 @@
+import numpy as np
+
+import common
+from rc import RosterChecker, RosterScoreState
+
+class BatchScorer:
+
+    # Roles of each slot of a roster
+    layout = np.array([0, 0, 1, 1, 2, 2, 2, 2, 2, 2])
+
+    """
+    Scores many sets of rosters at once, using the same objective as RosterChecker.CalcViabilityScoreAlt.
+    Candidates are arrays of shape (N candidates x Signups x 10) holding char ids, with the roster
+    for signup r at index r. Each roster has 2 tanks, 2 healers and 6 dps, in that order. Empty slots are -1.
+    Rosters with any other layout, such as 3 healers and 5 dps, can't be encoded and score 0, even though
+    CalcViabilityScoreAlt may score them above 0. Every sampler of rm.py fills rosters as 2/2/6.
+    """
+    def __init__(self, rc: RosterChecker):
+        self.rc = rc
+        chars = rc.chars
+        misc = rc.raid_comp_data["misc"]
+        roles = common.WoW.roles
+
+        # Features per char. The extra char at the end is used for empty slots
+        char_amount = len(chars.char_names)
+        self.empty = char_amount
+        size = char_amount + 1
+        self.buffs = np.zeros((len(roles), size, len(rc.buff_bits)), dtype=bool)
+        self.bit_scores = np.array(rc.bit_scores)
+        self.loot = np.zeros((size, len(rc.item_ids)), dtype=bool)
+        self.ratings = np.zeros((size, len(roles)))
+        self.soakers = np.zeros((size, len(roles)), dtype=bool)
+        self.players = np.full(size, -1)
+        self.classes = np.full(size, -1)
+
+        # Features per signup and char
+        signups = rc.signups
+        self.terms = np.zeros((len(signups), size, len(roles)))
+        self.active = np.zeros((len(signups), size), dtype=bool)
+        self.requires_soaker = np.array([s.RequiresSoaker() for s in signups], dtype=bool)
+        self.ms_bonus = np.array([misc["mortal-strike-covered"] if s.RequiresMotalStrike() else 0 for s in signups])
+        states = [RosterScoreState(rc, common.Roster(s, chars, rc.tmb, id)) for id, s in enumerate(signups)]
+
+        class_ids = {}
+        for c, name in enumerate(chars.char_names):
+            if name not in chars:
+                continue
+
+            char = chars[name]
+            loot_mask = rc.GetCharLootMask(name)
+            self.loot[c] = [bool(loot_mask >> i & 1) for i in range(0, len(rc.item_ids))]
+            self.players[c] = chars.GetPlayerIndex(name)
+            self.classes[c] = class_ids.setdefault(char["class"], len(class_ids))
+            for r, role in enumerate(roles):
+                buff_mask = rc.GetCharBuffMask(name, role)
+                self.buffs[r, c] = [bool(buff_mask >> i & 1) for i in range(0, len(rc.buff_bits))]
+                self.soakers[c, r] = RosterScoreState.IsSoaker(char, role)
+                if role != "dps":
+                    self.ratings[c, r] = rc.GetCharRating(char, role)
+
+            for s, state in enumerate(states):
+                self.active[s, c] = signups[s].CanPlayerRaid(char["discord_id"])
+                for r, role in enumerate(roles):
+                    self.terms[s, c, r] = state.CalcCharScore(char, role)
+
+        self.item_covered = misc["item-covered"]
+        self.same_healer = misc["same-healer"]
+        self.same_tank = misc["same-tank"]
+
+    """
+    Returns an array of shape (Signups x 10) with the char ids of the given rosters.
+    Rosters which don't have 2 tanks, 2 healers and 6 dps are left empty.
+    """
+    def Encode(self, rosters: "list[common.Roster]") -> np.ndarray:
+        encoding = np.full((len(self.rc.signups), len(BatchScorer.layout)), -1)
+        for r in rosters:
+            id, tanks, healers, dps = r.Encode()
+            if len(tanks) == 2 and len(healers) == 2 and len(dps) == 6:
+                encoding[id] = tanks + healers + dps
+        return encoding
+
+    """
+    Returns an array of shape (N x Signups x 10) with the char ids of each set of rosters
+    """
+    def EncodeBlock(self, roster_sets: "list[list[common.Roster]]") -> np.ndarray:
+        return np.array([self.Encode(rosters) for rosters in roster_sets])
+
+    """
+    Returns (scores, iscores) with shapes (N) and (N x Signups)
+    """
+    def Score(self, candidates: np.ndarray):
+        n, signup_amount, _ = candidates.shape
+        ids = np.where(candidates < 0, self.empty, candidates)
+        roles = BatchScorer.layout[None, None, :]
+        signups = np.arange(signup_amount)[None, :, None]
+
+        # Can we even raid with these rosters?
+        players = np.sort(self.players[ids], axis=2)
+        duplicated = (players[..., 1:] == players[..., :-1]).any(axis=2)
+        unavailable = ~self.active[signups, ids].all(axis=2)
+        has_soaker = self.soakers[ids, roles].any(axis=2)
+        valid = (candidates >= 0).all(axis=2) & ~duplicated & ~unavailable & (has_soaker | ~self.requires_soaker[None, :])
+
+        # Base score
+        loot = self.loot[ids].any(axis=2).sum(axis=2)
+        classes = self.classes[ids]
+        base = 1000 + self.item_covered * loot + self.ms_bonus[None, :] + self.terms[signups, ids, roles].sum(axis=2)
+        base = base + self.same_tank * (classes[..., 0] == classes[..., 1]) + self.same_healer * (classes[..., 2] == classes[..., 3])
+
+        # Buffs and ratings
+        covered = self.buffs[roles, ids].any(axis=2)
+        buff_score = covered.astype(np.int64) @ self.bit_scores
+        ratings = self.ratings[ids, roles].sum(axis=2)
+
+        iscores = np.where(valid & (base > 0), np.maximum(base + buff_score + ratings, 0), 0)
+        all_positive = (iscores > 0).all(axis=1)
+        inverse = 1 / np.where(iscores > 0, iscores, 1)
+        scores = np.where(all_positive, signup_amount / inverse.sum(axis=1), 0)
+        return scores, iscores
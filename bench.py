@@ -0,0 +1,121 @@
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import subprocess
+import tempfile
+import time
+
+import rm
+import sd
+import synth
+import tmb
+
+from guild import GuildContext
+from rc import RosterChecker
+
+RAID_COMP_DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), "raid-comp-data.json")
+
+class Guild:
+
+    def __init__(self, path: str):
+        self.path = path
+        self.raid_comp_data = RAID_COMP_DATA
+        self.chars_db = os.path.join(path, "characters-db.csv")
+        self.inactive_chars = os.path.join(path, "inactive-chars.json")
+        self.tmb_file = os.path.join(path, "character-json.json")
+        self.contested_items = os.path.join(path, "contested-items.json")
+        self.sfp = os.path.join(path, "s%i.json")
+
+def Measure(func, *args):
+    start = time.perf_counter()
+    res = func(*args)
+    return time.perf_counter() - start, res
+
+def BenchLoad(guild: Guild) -> dict:
+    context_time, context = Measure(GuildContext, guild.chars_db, guild.sfp, guild.raid_comp_data, guild.inactive_chars, guild.tmb_file, guild.contested_items)
+    rm_time, roster_master = Measure(rm.RosterMaster, context)
+    rc_time, roster_checker = Measure(RosterChecker, context)
+    return {"context_s" : context_time, "roster_master_s" : rm_time, "roster_checker_s" : rc_time}, roster_master, roster_checker
+
+def BenchGeneration(roster_master: rm.RosterMaster, iterations: int) -> dict:
+    elapsed, roster_sets = Measure(lambda : [roster_master.GenerateRandomRosters() for i in range(0, iterations)])
+    return {"iterations" : iterations, "total_s" : elapsed, "rosters_per_s" : iterations / elapsed}, roster_sets
+
+def BenchScoring(roster_checker: RosterChecker, roster_sets: list) -> dict:
+
+    # Every set is scored from scratch
+    cache_size = roster_checker.cache_size
+    roster_checker.cache_size = 0
+    latencies = []
+    for rosters in roster_sets:
+        elapsed, _ = Measure(roster_checker.CalcViabilityScoreAlt, rosters)
+        latencies.append(elapsed)
+    roster_checker.cache_size = cache_size
+
+    latencies.sort()
+    return {"calls" : len(latencies), "mean_ms" : sum(latencies) * 1000 / len(latencies), "p50_ms" : latencies[len(latencies) // 2] * 1000,
+            "p95_ms" : latencies[min(int(len(latencies) * 0.95), len(latencies) - 1)] * 1000}
+
+def BenchTMB(guild: Guild) -> dict:
+    characters = {}
+    for character in tmb.StreamJsonArray(guild.tmb_file):
+        characters[character["name"]] = tmb.Character(character)
+    elapsed, _ = Measure(tmb.calculate_update_prios, characters)
+    return {"characters" : len(characters), "calculate_update_prios_s" : elapsed}
+
+def BenchSlackerDetector(guild: Guild) -> dict:
+    load_time, detector = Measure(lambda : sd.SlackerDetector(GuildContext(guild.chars_db, guild.sfp)))
+    reports = {}
+    for report in ["Detect", "GetActivePlayers", "GetUnavailableActivesPerSignup", "GetActiveChars", "GetActivesPerSignup", "GetSlackersPerSignup", "GetInactivePlayers", "GetSlackers"]:
+        reports[report + "_s"] = Measure(getattr(detector, report))[0]
+    return {"load_s" : load_time, "reports" : reports}
+
+def RunBenchmark(char_amount: int, signup_amount: int, args) -> dict:
+    with tempfile.TemporaryDirectory() as path:
+        synth.GenerateGuild(path, char_amount, signup_amount, args.items, args.seed)
+        guild = Guild(path)
+
+        random.seed(args.seed)
+        res = {"chars" : char_amount, "signups" : signup_amount, "items" : args.items}
+        res["load"], roster_master, roster_checker = BenchLoad(guild)
+        res["generation"], roster_sets = BenchGeneration(roster_master, args.i)
+        res["scoring"] = BenchScoring(roster_checker, roster_sets)
+        res["tmb"] = BenchTMB(guild)
+        res["slacker_detector"] = BenchSlackerDetector(guild)
+        return res
+
+def GetVersion() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=os.path.dirname(os.path.abspath(__file__)), stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+def main():
+
+    parser = argparse.ArgumentParser(prog='Bench', description='Benchmarks loading, generation, scoring and reports on synthetic guilds', epilog='Call with --help to find a list of available commands')
+    parser.add_argument("--sizes", default="30x3,120x5,500x10,2000x30", help="Comma separated list of <chars>x<signups>")
+    parser.add_argument("--items", default=20, type=int, help="Amount of contested items")
+    parser.add_argument("--seed", default=0, type=int)
+    parser.add_argument("-i", default=200, type=int, help="Roster sets generated and scored per size")
+    parser.add_argument("-o", default="bench.json")
+    args = parser.parse_args()
+
+    logging.basicConfig(format='%(levelname)s: %(message)s', level=logging.WARNING)
+
+    results = {"version" : GetVersion(), "python" : platform.python_version(), "date" : time.strftime("%Y-%m-%d %H:%M:%S"), "runs" : []}
+    for size in args.sizes.split(","):
+        char_amount, signup_amount = [int(a) for a in size.split("x")]
+        print("Benchmarking {} chars and {} signups".format(char_amount, signup_amount), flush=True)
+        res = RunBenchmark(char_amount, signup_amount, args)
+        results["runs"].append(res)
+        print("Load: {:.3f}s Generation: {:.0f} rosters/s Scoring: {:.3f}ms TMB prios: {:.3f}s".format(res["load"]["context_s"] + res["load"]["roster_checker_s"], res["generation"]["rosters_per_s"],
+              res["scoring"]["mean_ms"], res["tmb"]["calculate_update_prios_s"]))
+
+    with open(args.o, 'w') as f:
+        json.dump(results, f, indent=1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+import hashlib
+import logging
+import json
+import os
+import pickle
+import tempfile
+
+import common
+import tmb
+
+# Bump when the layout of the cached objects changes
+VERSION = 1
+
+# Folder of the cache files used when none is given. It belongs to the user rather than being shared with the inputs
+DEFAULT_FOLDER = os.path.join(os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache"), "rostermaster")
+
+# Cached objects are instances of classes defined in these modules
+SOURCES = ["common.py", "tmb.py", "cache.py"]
+
+"""
+Parsed inputs stored on disk, so warm runs skip parsing and indexing files which haven't changed.
+Each entry remembers the files it was built from. It's rebuilt when any of them changes, first
+checking mtime and size, then the content hash in case the file was only touched.
+Every entry is stored in the same pickle, so objects shared between entries stay shared after loading.
+Loading a pickle can run arbitrary code, so only load cache files written by yourself.
+"""
+class InputCache:
+
+    def __init__(self, filename: str):
+        self.filename = filename
+        self.entries = {} # K = Key, V = (Dependencies, Object). Dependencies are a list of (path, mtime_ns, size, hash)
+        self.hashes = {} # K = Path, V = Hash of files read in this run
+        self.dirty = False
+        self.hits = 0
+        self.misses = 0
+
+        if os.path.isfile(filename):
+            try:
+                with open(filename, 'rb') as f:
+                    data = pickle.load(f)
+                if data["version"] == VERSION and data["sources"] == InputCache.GetSourcesHash():
+                    self.entries = data["entries"]
+                else:
+                    logging.info("Input cache {} is outdated, rebuilding it".format(filename))
+            except Exception as e:
+                logging.warning("Could not read input cache {}: {}".format(filename, e))
+
+    def GetSourcesHash() -> str:
+        sha = hashlib.sha1()
+        folder = os.path.dirname(os.path.abspath(__file__))
+        for source in SOURCES:
+            with open(os.path.join(folder, source), 'rb') as f:
+                sha.update(f.read())
+        return sha.hexdigest()
+
+    def GetHash(self, path: str) -> str:
+        if path not in self.hashes:
+            with open(path, 'rb') as f:
+                self.hashes[path] = hashlib.sha1(f.read()).hexdigest()
+        return self.hashes[path]
+
+    def GetDependency(self, path: str) -> tuple:
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        return (path, stat.st_mtime_ns, stat.st_size, self.GetHash(path))
+
+    def IsValid(self, dependencies: list) -> bool:
+        for i, (path, mtime, size, hash) in enumerate(dependencies):
+            if not os.path.isfile(path):
+                return False
+
+            stat = os.stat(path)
+            if stat.st_size != size:
+                return False
+            if stat.st_mtime_ns != mtime:
+                if self.GetHash(path) != hash:
+                    return False
+
+                # Only touched. Remember the new mtime, so it's not hashed again next run
+                dependencies[i] = (path, stat.st_mtime_ns, size, hash)
+                self.dirty = True
+
+        return True
+
+    """
+    Returns the object cached under key, calling builder to build it if any of the given files changed since
+    """
+    def Get(self, key: tuple, paths: "list[str]", builder):
+        if key in self.entries:
+            dependencies, obj = self.entries[key]
+            if [d[0] for d in dependencies] == [os.path.abspath(p) for p in paths] and self.IsValid(dependencies):
+                self.hits = self.hits + 1
+                return obj
+
+        self.misses = self.misses + 1
+        obj = builder()
+        self.entries[key] = ([self.GetDependency(p) for p in paths], obj)
+        self.dirty = True
+        return obj
+
+    """
+    Default cache file for the inputs in the dir of the characters db. Each dir gets its own file
+    """
+    def GetDefaultFilename(characters_db: str) -> str:
+        folder = os.path.dirname(os.path.abspath(characters_db))
+        return os.path.join(DEFAULT_FOLDER, "input-cache-{}.pickle".format(hashlib.sha1(folder.encode()).hexdigest()[:16]))
+
+    """
+    Writes the cache to disk, if anything was rebuilt
+    """
+    def Save(self):
+        if not self.dirty:
+            return
+
+        # Write to a temp file first, so concurrent runs never read a partial cache
+        folder = os.path.dirname(os.path.abspath(self.filename))
+        data = {"version" : VERSION, "sources" : InputCache.GetSourcesHash(), "entries" : self.entries}
+        tmp = None
+        try:
+            os.makedirs(folder, mode=0o700, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=folder, prefix=".input-cache")
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, self.filename)
+            self.dirty = False
+        except OSError as e:
+            logging.warning("Could not write input cache {}: {}".format(self.filename, e))
+            if tmp and os.path.isfile(tmp):
+                os.remove(tmp)
+
+"""
+Loaders for each input. They work the same without a cache, building everything from scratch
+"""
+def Get(cache: InputCache, key: tuple, paths: "list[str]", builder):
+    if cache is None:
+        return builder()
+    return cache.Get(key, paths, builder)
+
+def LoadJson(path: str, cache: InputCache = None):
+    return Get(cache, ("json", os.path.abspath(path)), [path], lambda : json.load(open(path, encoding='utf8')))
+
+def LoadCharacterBD(path: str, cache: InputCache = None) -> common.CharacterBD:
+    return Get(cache, ("chars", os.path.abspath(path)), [path], lambda : common.CharacterBD(path))
+
+def LoadTMB(path: str, item_ids: set = None, cache: InputCache = None) -> dict:
+    key = ("tmb", os.path.abspath(path), frozenset(item_ids) if item_ids is not None else None)
+    return Get(cache, key, [path], lambda : tmb.LoadFromFile(path, item_ids))
+
+def LoadSignups(char_db: common.CharacterBD, char_db_file: str, filename_pattern: str, cache: InputCache = None) -> "list[common.Signup]":
+    signups = []
+    for filename in common.Signup.GetSignupFiles(filename_pattern):
+        key = ("signup", os.path.abspath(filename), os.path.abspath(char_db_file))
+        signup = Get(cache, key, [filename, char_db_file], lambda : common.Signup(char_db, filename))
+
+        # Signup pools point to the char db they were built with
+        if signup.charDB is not char_db:
+            cache.entries.pop(key)
+            signup = Get(cache, key, [filename, char_db_file], lambda : common.Signup(char_db, filename))
+        signups.append(signup)
+
+    return signups
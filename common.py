@@ -1,10 +1,12 @@
 import csv
 import json
 import os.path
+import types
 
 class WoW:
 
     roles = ["tank", "healer", "dps"]
+    role_ids = {"tank" : 0, "healer" : 1, "dps" : 2}
 
 class CharacterBD:
 
@@ -14,6 +16,14 @@ class CharacterBD:
             reader = csv.DictReader(csvfile, fieldnames=["name", "class", "spec", "offspec", "tank", "healer", "dps", "r1", "r2", "r3", "is_main", "has_quit", "discord_user", "discord_id"])
             self.chars = {}
 
+            # Indices
+            self.player_chars = {} # K = Discord id, V = {K = Char name, V = Char}
+            self.players = {} # K = Discord id, V = Main char name, or first char if there's no main
+            self.mains = {} # K = Discord id, V = Main char name
+            self.player_index = {} # K = Discord id, V = Player index
+            self.char_ids = {} # K = Char name, V = Char index
+            self.char_names = [] # K = Char index, V = Char name
+
             # Skip 4 header rows
             for i in range(0, 4):
                 reader.__next__()
@@ -32,9 +42,67 @@ class CharacterBD:
                         elif row[role] == "OS":
                             char["OS"] = role
 
-                    self.chars[row["name"].strip()] = char
+                    self.AddCharacter(char)
                 else:
                     return
+
+    def AddCharacter(self, char: dict):
+        name = char["name"]
+        discord_id = char["discord_id"]
+        old = self.chars.get(name)
+
+        # Replacing a char keeps its id and its position in the db
+        self.chars[name] = char
+        if name not in self.char_ids:
+            self.char_ids[name] = len(self.char_names)
+            self.char_names.append(name)
+
+        if discord_id not in self.player_chars:
+            self.player_chars[discord_id] = {}
+            self.player_index[discord_id] = len(self.player_index)
+
+        if old is None:
+            self.player_chars[discord_id][name] = char
+            if discord_id not in self.players or char["is_main"]:
+                self.players[discord_id] = name
+            if char["is_main"] and discord_id not in self.mains:
+                self.mains[discord_id] = name
+            return
+
+        # Only the entries of the players owning the char are rebuilt
+        player_chars = self.player_chars[discord_id]
+        if name in player_chars:
+            player_chars[name] = char
+        else:
+            self.player_chars[old["discord_id"]].pop(name)
+            self.UpdatePlayer(old["discord_id"])
+            player_chars[name] = char
+            self.player_chars[discord_id] = dict(sorted(player_chars.items(), key=lambda x : self.char_ids[x[0]]))
+        self.UpdatePlayer(discord_id)
+
+    def RemoveCharacter(self, char_name: str):
+        char = self.chars.pop(char_name)
+        discord_id = char["discord_id"]
+        self.player_chars[discord_id].pop(char_name)
+        self.UpdatePlayer(discord_id)
+
+    """
+    Rebuilds the player and main entries of a player from its chars, which are kept in db order
+    """
+    def UpdatePlayer(self, discord_id: str):
+        player = None
+        main = None
+        for name, c in self.player_chars[discord_id].items():
+            if player is None or c["is_main"]:
+                player = name
+            if c["is_main"] and main is None:
+                main = name
+
+        for index, value in [(self.players, player), (self.mains, main)]:
+            if value is None:
+                index.pop(discord_id, None)
+            else:
+                index[discord_id] = value
                 
     def __getitem__(self, key: str) -> dict:
         return self.chars[key]
@@ -46,12 +114,7 @@ class CharacterBD:
         return self.chars.items()
                 
     def FindCharacters(self, discord_id: str):
-        chars = {}
-        for _, char in self.chars.items():
-            if char["discord_id"] == discord_id:
-                chars[char["name"]] = char
-
-        return chars
+        return dict(self.player_chars.get(discord_id, {}))
     
     def GetDiscordId(self, char_name: str):
         return self.chars[char_name]['discord_id']
@@ -63,19 +126,19 @@ class CharacterBD:
         return chars
     
     def GetPlayers(self) -> dict:
-        players = {}
-        for char_name, char in self.chars.items():
-            if char['discord_id'] not in players:
-                players[char['discord_id']] = char_name
-            elif char['is_main']: 
-                players[char['discord_id']] = char_name
-        return players
+        return dict(self.players)
+    
+    def GetCharId(self, char_name: str) -> int:
+        return self.char_ids[char_name]
+    
+    def GetCharName(self, char_id: int) -> str:
+        return self.char_names[char_id]
+    
+    def GetPlayerIndex(self, char_name: str) -> int:
+        return self.player_index[self.chars[char_name]["discord_id"]]
     
     def GetMain(self, discord_id: str):
-        for _, char in self.chars.items():
-            if char["discord_id"] == discord_id and char["is_main"]:
-                return char["name"]
-        return None
+        return self.mains.get(discord_id)
     
     def GetMainByAlt(self, char_name: str):
         discord_id = self.chars[char_name]["discord_id"]
@@ -84,17 +147,19 @@ class CharacterBD:
 class Signup:
 
     def LoadSignups(char_db : CharacterBD, filename_pattern: str) -> "list[Signup]":
-        signups = []
+        return [Signup(char_db, filename) for filename in Signup.GetSignupFiles(filename_pattern)]
+
+    def GetSignupFiles(filename_pattern: str) -> "list[str]":
+        files = []
         file_num = 1
         filename = filename_pattern.replace("%i", str(file_num))
         while os.path.isfile(filename):
-            s = Signup(char_db, filename)
-            signups.append(s)
+            files.append(filename)
 
             file_num = file_num + 1
             filename = filename_pattern.replace("%i", str(file_num))
 
-        return signups
+        return files
 
 
     def __init__(self, charDB, file):
@@ -114,25 +179,41 @@ class Signup:
             if p["signup"] != "Absence":
                 self.active_players[p["discord_id"]] = p
 
+        # Precompute active chars pools
+        self.active_chars = {}
+        self.active_chars_by_role = {role : {} for role in WoW.roles}
+        self.signed_chars = set() # Chars whose spec matches the signup's
+        for _, c in self.charDB.items():
+            discord_id = c["discord_id"]
+            if self.CanPlayerRaid(discord_id):
+                self.active_chars[c["name"]] = c
+                for role in WoW.roles:
+                    if c[role]:
+                        self.active_chars_by_role[role][c["name"]] = c
+
+                if c["spec"] in self.active_players[discord_id]["spec"]:
+                    self.signed_chars.add(c["name"])
+
     def HasPlayerSignedUp(self, discord_id):
         return discord_id in self.players
     
     def CanPlayerRaid(self, discord_id):
         return discord_id in self.active_players
     
-    def GetActiveCharsByRole(self, role):
-        chars = {}
-        for _, c in self.charDB.chars.items():
-            if self.CanPlayerRaid(c["discord_id"]) and c[role]:
-                chars[c["name"]] = c
-        return chars
+    def HasCharSignedUp(self, char_name: str):
+        return char_name in self.signed_chars
     
-    def GetActiveChars(self) -> dict: 
-        chars = {}
-        for _, c in self.charDB.chars.items():
-            if self.CanRaid(c["discord_id"]):
-                chars[c["name"]] = c
-        return chars
+    """
+    Returns a read-only view. Copy it before modifying
+    """
+    def GetActiveCharsByRole(self, role) -> types.MappingProxyType:
+        return types.MappingProxyType(self.active_chars_by_role[role])
+    
+    """
+    Returns a read-only view. Copy it before modifying
+    """
+    def GetActiveChars(self) -> types.MappingProxyType: 
+        return types.MappingProxyType(self.active_chars)
     
     def GetActivePlayers(self) -> dict:
         return self.active_players
@@ -152,8 +233,16 @@ class Signup:
     
 class Roster:
 
+    __slots__ = ["signup", "chars", "tmb", "id", "char_ids", "role_ids", "player_ids", "class_counts", "roster_set"]
+
     def __init__(self, signup : Signup, char_db, tmb, id):
-        self.roster = {} # K = Char name, R = Role
+
+        # Parallel arrays, in the order chars were rostered
+        self.char_ids = [] # Char index in char_db
+        self.role_ids = [] # Role index in WoW.roles
+        self.player_ids = [] # Player index in char_db
+        self.class_counts = {} # K = Class, V = Amount of chars
+        self.roster_set = None # RosterSet to notify when chars are rostered or unrostered
 
         self.signup = signup
         self.chars = char_db
@@ -161,19 +250,66 @@ class Roster:
         self.id = id
 
     def __getitem__(self, key):
-        return self.roster[key]
+        index = self.char_ids.index(self.chars.GetCharId(key))
+        return WoW.roles[self.role_ids[index]]
     
     def __contains__(self, key):
-        return key in self.roster
+        return self.chars.char_ids.get(key) in self.char_ids
+    
+    def __iter__(self):
+        return iter(self.GetChars())
     
     """
     Returns K = Char name, R = Role
     """
     def items(self):
-        return self.roster.items()
+        names = self.chars.char_names
+        return [(names[c], WoW.roles[r]) for c, r in zip(self.char_ids, self.role_ids)]
+    
+    """
+    Read-only name based view of the roster. K = Char name, R = Role. Use RosterChar and UnrosterChar to change it
+    """
+    @property
+    def roster(self) -> types.MappingProxyType:
+        return types.MappingProxyType(dict(self.items()))
     
     def __str__(self):
-        return str(self.roster)
+        return str(dict(self.items()))
+    
+    """
+    Returns (Roster id, tank ids, healer ids, dps ids)
+    """
+    def Encode(self) -> tuple:
+        encoding = [self.id]
+        for role_id in range(0, len(WoW.roles)):
+            encoding.append(tuple([c for c, r in zip(self.char_ids, self.role_ids) if r == role_id]))
+        return tuple(encoding)
+    
+    def Decode(encoding: tuple, signups: "list[Signup]", char_db: CharacterBD, tmb) -> "Roster":
+        id = encoding[0]
+        roster = Roster(signups[id], char_db, tmb, id)
+        for role, char_ids in zip(WoW.roles, encoding[1:]):
+            for char_id in char_ids:
+                roster.RosterChar(char_db.GetCharName(char_id), role)
+        return roster
+
+    """
+    Canonical key of this roster, regardless of the order chars were rostered in.
+    Scores depend on the signup, so it's keyed on the signup index too. It's the same in every process
+    """
+    def GetKey(self) -> tuple:
+        return (self.id, tuple(sorted(zip(self.char_ids, self.role_ids))))
+    
+    def GetSetKey(rosters: "list[Roster]") -> tuple:
+        return tuple(sorted([r.GetKey() for r in rosters]))
+
+    def Copy(self):
+        roster = Roster(self.signup, self.chars, self.tmb, self.id)
+        roster.char_ids = list(self.char_ids)
+        roster.role_ids = list(self.role_ids)
+        roster.player_ids = list(self.player_ids)
+        roster.class_counts = dict(self.class_counts)
+        return roster
     
     def print(self):
         print("{0:<6s}Roster {1}".format("", self.signup.title))
@@ -194,19 +330,48 @@ class Roster:
                 print("{0:<16s}".format(char2), end='')
             print()
 
+    def GetChars(self) -> "list[str]":
+        names = self.chars.char_names
+        return [names[c] for c in self.char_ids]
+
     def GetCharsByRole(self, role):
-        chars = []
-        for c, r in self.roster.items():
-            if r == role:
-                chars.append(c)
-        return chars
+        role_id = WoW.role_ids[role]
+        names = self.chars.char_names
+        return [names[c] for c, r in zip(self.char_ids, self.role_ids) if r == role_id]
     
     def RosterChar(self, char_name, role):
 
         if role in WoW.roles:
-            self.roster[char_name] = role
+            char_id = self.chars.GetCharId(char_name)
+            if char_id in self.char_ids:
+                self.role_ids[self.char_ids.index(char_id)] = WoW.role_ids[role]
+                return
+            
+            char = self.chars[char_name]
+            self.char_ids.append(char_id)
+            self.role_ids.append(WoW.role_ids[role])
+            self.player_ids.append(self.chars.GetPlayerIndex(char_name))
+            self.class_counts[char["class"]] = self.class_counts.get(char["class"], 0) + 1
+            if self.roster_set is not None:
+                self.roster_set.OnRostered(self, char_name)
         else:
             print("Error: Role {} doesn't exist".format(role))
+
+    def UnrosterChar(self, char_name):
+        index = self.char_ids.index(self.chars.GetCharId(char_name))
+        self.char_ids.pop(index)
+        self.player_ids.pop(index)
+        role_id = self.role_ids.pop(index)
+
+        class_ = self.chars[char_name]["class"]
+        self.class_counts[class_] = self.class_counts[class_] - 1
+        if self.class_counts[class_] == 0:
+            self.class_counts.pop(class_)
+
+        if self.roster_set is not None:
+            self.roster_set.OnUnrostered(self, char_name)
+
+        return WoW.roles[role_id]
     
     def ContainsAlt(self, char_name: str):
         discord_id = self.chars[char_name]['discord_id']
@@ -214,22 +379,26 @@ class Roster:
         return res and c['name'] != char_name
 
     def ContainsPlayer(self, discord_id: str):
-        for c, r in self.roster.items():
-            if self.chars[c]['discord_id'] == discord_id:
-                return r != "bench", c
+        player_id = self.chars.player_index.get(discord_id)
+        if player_id in self.player_ids:
+            index = self.player_ids.index(player_id)
+            return WoW.roles[self.role_ids[index]] != "bench", self.chars.GetCharName(self.char_ids[index])
         return False
     
     def ContainsChar(self, char: str):
-        return char in self.roster and self.roster[char] != "bench"
+        return char in self
     
     def GetPlayerAmount(self):
-        return len(self.roster)
+        return len(self.char_ids)
 
     def IsValid(self):
-        return len(self.roster) == 10
+        return len(self.char_ids) == 10
     
     def GetSoaker(self):
-        for c, r in self.roster.items():
+        if "Rogue" not in self.class_counts and "Priest" not in self.class_counts:
+            return None
+        
+        for c, r in self.items():
             char = self.chars[c]
             if char['class'] == "Rogue" or (char['class'] == "Priest" and r == "dps"):
                 return char['name']
@@ -237,8 +406,117 @@ class Roster:
         return None
     
     def GetShaman(self):
+        if "Shaman" not in self.class_counts:
+            return None
+        
         for c, r in self.items():
             char = self.chars[c]
             if char["class"] == "Shaman":
                 return char
         return None
+
+"""
+List of rosters which knows which rosters each char and player have been rostered in. Rosters added to a tracking set
+notify it whenever a char is rostered or unrostered, so a roster can only be tracked by one set at a time.
+Rosters can only be added or reordered, never replaced or removed, so the indexes can't go stale.
+"""
+class RosterSet:
+
+    __slots__ = ["rosters", "track", "char_rosters", "player_rosters"]
+
+    def __init__(self, rosters: "list[Roster]" = (), track: bool = True):
+        self.rosters = []
+        self.track = track
+        self.char_rosters = {} # K = Char name, V = Rosters with this char
+        self.player_rosters = {} # K = Discord id, V = Rosters with a char of this player. Once per char
+
+        for r in rosters:
+            self.append(r)
+
+    def __len__(self):
+        return len(self.rosters)
+
+    def __iter__(self):
+        return iter(self.rosters)
+
+    def __getitem__(self, key):
+        return self.rosters[key]
+
+    def __contains__(self, roster):
+        return roster in self.rosters
+
+    def __repr__(self):
+        return "RosterSet({})".format(self.rosters)
+
+    def sort(self, key=None, reverse=False):
+        self.rosters.sort(key=key, reverse=reverse)
+
+    def index(self, roster) -> int:
+        return self.rosters.index(roster)
+
+    """
+    Returns rosters if it's already a RosterSet. Otherwise, returns a snapshot which isn't updated if the rosters change
+    """
+    def Of(rosters: "list[Roster]") -> "RosterSet":
+        if isinstance(rosters, RosterSet):
+            return rosters
+        return RosterSet(rosters, track=False)
+
+    def append(self, roster: Roster):
+        self.rosters.append(roster)
+        if self.track:
+            roster.roster_set = self
+
+        for char_name in roster.GetChars():
+            self.OnRostered(roster, char_name)
+
+    def extend(self, rosters: "list[Roster]"):
+        for r in rosters:
+            self.append(r)
+
+    def OnRostered(self, roster: Roster, char_name: str):
+        self.char_rosters.setdefault(char_name, []).append(roster)
+        self.player_rosters.setdefault(roster.chars.GetDiscordId(char_name), []).append(roster)
+
+    def OnUnrostered(self, roster: Roster, char_name: str):
+        RosterSet.RemoveEntry(self.char_rosters, char_name, roster)
+        RosterSet.RemoveEntry(self.player_rosters, roster.chars.GetDiscordId(char_name), roster)
+
+    def RemoveEntry(index: dict, key: str, roster: Roster):
+        rosters = index[key]
+        rosters.remove(roster)
+        if not rosters:
+            index.pop(key)
+
+    def IsRostered(self, char_name: str) -> bool:
+        return char_name in self.char_rosters
+
+    def GetRosters(self, char_name: str) -> "list[Roster]":
+        return list(self.char_rosters.get(char_name, []))
+
+    def IsPlayerRostered(self, discord_id: str) -> bool:
+        return discord_id in self.player_rosters
+
+    def GetPlayerRosters(self, discord_id: str) -> "list[Roster]":
+        return list(self.player_rosters.get(discord_id, []))
+
+    """
+    Returns K = Char name, V = Role, for chars rostered more than once. In the order the rosters list them
+    """
+    def GetDuplicates(self) -> dict:
+        positions = {}
+        duplicates = []
+        for char_name, rosters in self.char_rosters.items():
+            if len(rosters) > 1:
+                if not positions:
+                    positions = {id(r) : i for i, r in enumerate(self)}
+
+                # Sort by first roster, second roster and position in the first roster
+                order = sorted(rosters, key=lambda r : positions[id(r)])
+                first = order[0]
+                index = first.char_ids.index(first.chars.GetCharId(char_name))
+                duplicates.append(((positions[id(first)], positions[id(order[1])], index), char_name, first[char_name]))
+
+        duplicates.sort(key=lambda x : x[0])
+        return {char_name : role for _, char_name, role in duplicates}
+
@@ -0,0 +1,63 @@
+import gc
+
+import cache
+
+"""
+Every input of a guild, loaded and indexed once and shared by RosterMaster, RosterChecker and SlackerDetector.
+It's immutable once loaded, so all of them see the same snapshot of the data. Inputs without a file are None.
+Forked workers can inherit it as is, instead of loading or unpickling it again.
+"""
+class GuildContext:
+
+    __slots__ = ["raid_comp_data", "chars", "inactive_chars", "contested_items", "tmb", "signups", "frozen"]
+
+    def __init__(self, charDB_file: str, sfp: str, raid_comp_data: str = None, inactive_chars: str = None, tmb_file: str = None,
+                 contested_items_file: str = None, input_cache: cache.InputCache = None):
+        object.__setattr__(self, "frozen", False)
+
+        self.chars = cache.LoadCharacterBD(charDB_file, input_cache)
+        self.signups = tuple(cache.LoadSignups(self.chars, charDB_file, sfp, input_cache))
+        self.raid_comp_data = cache.LoadJson(raid_comp_data, input_cache) if raid_comp_data else None
+        self.inactive_chars = cache.LoadJson(inactive_chars, input_cache) if inactive_chars else None
+        self.contested_items = cache.LoadJson(contested_items_file, input_cache) if contested_items_file else None
+        self.tmb = None
+        if tmb_file:
+            item_ids = {int(id) for id in self.contested_items} if self.contested_items is not None else None
+            self.tmb = cache.LoadTMB(tmb_file, item_ids, input_cache)
+
+        self.frozen = True
+
+    def __setattr__(self, name, value):
+        if self.frozen:
+            raise AttributeError("GuildContext is immutable, can't set {}".format(name))
+        object.__setattr__(self, name, value)
+
+    def __getstate__(self):
+        return {name : getattr(self, name) for name in GuildContext.__slots__}
+
+    def __setstate__(self, state):
+        for name, value in state.items():
+            object.__setattr__(self, name, value)
+
+    """
+    Loads every input given in the parsed command line args. Uses and updates the input cache unless disabled.
+    The cache is kept in the user's cache dir by default
+    """
+    def FromArgs(args) -> "GuildContext":
+        input_cache = None
+        if not getattr(args, "no_input_cache", False):
+            filename = args.input_cache or cache.InputCache.GetDefaultFilename(args.characters_db)
+            input_cache = cache.InputCache(filename)
+        context = GuildContext(args.characters_db, args.sfp, getattr(args, "raid_comp_data", None), getattr(args, "inactive_chars", None),
+                               getattr(args, "tmb_file", None), getattr(args, "contested_items", None), input_cache)
+        if input_cache:
+            input_cache.Save()
+        return context
+
+    """
+    Moves every object loaded so far out of the garbage collector's reach. Forked workers then share
+    the context's memory pages with the parent, instead of copying them when the collector touches them.
+    """
+    def Share(self):
+        gc.collect()
+        gc.freeze()
@@ -0,0 +1,84 @@
+import functools
+import json
+import time
+
+# Instrumentation is only installed once enabled, so it costs nothing otherwise
+enabled = False
+timers = {} # K = Stage, V = [Calls, Cumulative seconds]
+counters = {} # K = Counter, V = Amount
+
+def Enable():
+    global enabled
+    enabled = True
+
+"""
+Wraps the given functions of owner (a class or a module) with timers named <prefix>.<function>
+"""
+def Instrument(owner, names: "list[str]", prefix: str = None):
+    if not enabled:
+        return
+
+    prefix = prefix if prefix else owner.__name__
+    for name in names:
+        func = getattr(owner, name)
+        if not getattr(func, "profiled", False):
+            setattr(owner, name, Timed(prefix + "." + name, func))
+
+def Timed(stage: str, func):
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            AddTime(stage, time.perf_counter() - start)
+
+    wrapper.profiled = True
+    return wrapper
+
+def AddTime(stage: str, seconds: float, calls: int = 1):
+    timer = timers.setdefault(stage, [0, 0])
+    timer[0] = timer[0] + calls
+    timer[1] = timer[1] + seconds
+
+def Count(counter: str, amount: int = 1):
+    if enabled:
+        counters[counter] = counters.get(counter, 0) + amount
+
+def GetStats() -> dict:
+    return {"timers" : {stage : list(timer) for stage, timer in timers.items()}, "counters" : dict(counters)}
+
+"""
+Returns what was recorded between two GetStats calls
+"""
+def Diff(after: dict, before: dict) -> dict:
+    stats = {"timers" : {}, "counters" : {}}
+    for stage, (calls, seconds) in after["timers"].items():
+        prev_calls, prev_seconds = before["timers"].get(stage, [0, 0])
+        if calls > prev_calls:
+            stats["timers"][stage] = [calls - prev_calls, seconds - prev_seconds]
+    for counter, amount in after["counters"].items():
+        if amount > before["counters"].get(counter, 0):
+            stats["counters"][counter] = amount - before["counters"].get(counter, 0)
+    return stats
+
+def Merge(stats: dict):
+    for stage, (calls, seconds) in stats["timers"].items():
+        AddTime(stage, seconds, calls)
+    for counter, amount in stats["counters"].items():
+        counters[counter] = counters.get(counter, 0) + amount
+
+def PrintTable(stats: dict):
+    print("{0:<50s}{1:>12s}{2:>14s}{3:>14s}".format("Stage", "Calls", "Total (s)", "Mean (ms)"))
+    for stage, (calls, seconds) in sorted(stats["timers"].items(), key=lambda x : x[1][1], reverse=True):
+        print("{0:<50s}{1:>12d}{2:>14.3f}{3:>14.4f}".format(stage, calls, seconds, seconds * 1000 / calls))
+    print()
+
+    for counter, amount in sorted(stats["counters"].items()):
+        print("{0:<50s}{1:>12d}".format(counter, amount))
+    print()
+
+def Save(stats: dict, filename: str):
+    with open(filename, 'w') as f:
+        json.dump(stats, f, indent=1)
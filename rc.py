@@ -1,11 +1,18 @@
 import argparse
+import cache
+import collections
 import json
 import math
 import logging
+import multiprocessing
+import os
 import statistics
 
 import tmb
 import common
+import profiling
+
+from guild import GuildContext
 
 class Report:
 
@@ -78,19 +85,153 @@ class Report:
 
         print()
 
+    """
+    Same information as print, as a dict that can be saved to JSON. Errors make the roster unviable, warnings don't
+    """
+    def ToDict(self, iscore) -> dict:
+        rc = self.roster_checker
+        r = self.roster
+
+        errors = []
+        if not r.IsValid():
+            errors.append("Roster has {} characters instead of 10".format(r.GetPlayerAmount()))
+        if r.signup.RequiresSoaker() and r.GetSoaker() is None:
+            errors.append("Soaker not found")
+        for c, char in self.unavailable_chars.items():
+            errors.append("Character {}({}) cannot raid this day".format(c, char["discord_id"]))
+        for _, c in self.duplicated_players.items():
+            errors.append("Player {} would be using two chars".format(c))
+
+        warnings = []
+        if r.GetShaman() is None:
+            warnings.append("Shaman not found")
+        for c, role in r.items():
+            if c in rc.inactive_chars and rc.inactive_chars[c]:
+                warnings.append("Using inactive char: {}".format(c))
+            if c not in rc.signed_chars:
+                warnings.append("Using character {} which didn't sign up".format(c))
+
+        loot = {}
+        for id, char in self.loot.items():
+            loot[id] = {"name" : rc.contested_items[id]["name"], "char" : char["name"] if char else None, "prio" : char["prio"] if char else None}
+
+        mortal_strike = None
+        if r.signup.RequiresMotalStrike():
+            covered, mortal_strike = rc.IsBuffCovered(r, rc.raid_comp_data['debuffs']['mortal-strike'])
+
+        buff_score, debuff_score = rc.CalcBuffCoverageScore(r)
+        return {
+            "signup" : rc.signups.index(r.signup),
+            "title" : r.signup.title,
+            "valid" : bool(self.IsRaidViable()),
+            "score" : iscore,
+            "chars" : {role : r.GetCharsByRole(role) for role in common.WoW.roles},
+            "soaker" : r.GetSoaker(),
+            "mortal_strike" : mortal_strike,
+            "buffs" : [buff for buff, is_covered in self.covered_buffs["buffs"].items() if is_covered],
+            "missing_buffs" : [buff for buff, is_covered in self.covered_buffs["buffs"].items() if not is_covered],
+            "debuffs" : [debuff for debuff, is_covered in self.covered_buffs["debuffs"].items() if is_covered],
+            "missing_debuffs" : [debuff for debuff, is_covered in self.covered_buffs["debuffs"].items() if not is_covered],
+            "buff_score" : buff_score,
+            "debuff_score" : debuff_score,
+            "loot" : loot,
+            "bench" : self.benched_chars,
+            "errors" : errors,
+            "warnings" : warnings,
+        }
+
 class RosterChecker:
 
-    def __init__(self, raid_comp_data, charDB_file, inactive_chars, tmb_file, contested_items_file, sfp):
-        self.raid_comp_data = json.load(open(raid_comp_data))
-        self.chars = common.CharacterBD(charDB_file)
-        self.inactive_chars = json.load(open(inactive_chars))
-        self.contested_items = json.load(open(contested_items_file))
-        self.tmb = tmb.ReadDataFromJson(tmb.GetDataFromFile(tmb_file))
-        self.signups = common.Signup.LoadSignups(self.chars, sfp)
+    def __init__(self, context: GuildContext):
+        self.context = context
+        self.raid_comp_data = context.raid_comp_data
+        self.chars = context.chars
+        self.inactive_chars = context.inactive_chars
+        self.contested_items = context.contested_items
+        self.tmb = context.tmb
+        self.signups = context.signups
+        self.signed_chars = set().union(*[s.signed_chars for s in self.signups]) # Chars which signed up for at least one raid
+
+        self.CompileBuffTables()
+        self.CompileLootTables()
+
+        # Roster scores. K = Roster.GetKey(), V = Score
+        self.score_cache = collections.OrderedDict()
+        self.cache_size = 100000
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def CompileBuffTables(self):
+        
+        # Each buff/debuff gets a bit. Buffs come first, then debuffs
+        self.buff_bits = [] # K = Bit index, V = (type, name)
+        self.bit_scores = []
+        self.spec_masks = {} # K = (class, spec), V = Bitmask
+        for type_ in ["buffs", "debuffs"]:
+            for name, buff in self.raid_comp_data[type_].items():
+                bit = 1 << len(self.buff_bits)
+                self.buff_bits.append((type_, name))
+                self.bit_scores.append(buff["score"])
+                for spec in buff["provided_by"]:
+                    class_, spec = spec.split(":", 1)
+                    key = (class_, spec)
+                    self.spec_masks[key] = self.spec_masks.get(key, 0) | bit
+
+        self.buffs_mask = (1 << len(self.raid_comp_data["buffs"])) - 1
+        self.char_masks = {} # K = (char name, role), V = Bitmask
+        self.char_id_masks = {} # K = (char id, role id), V = Bitmask
+
+    def GetCharBuffMask(self, char_name: str, role: str) -> int:
+        key = (char_name, role)
+        if key not in self.char_masks:
+            mask = 0
+            if role != "bench":
+                char = self.chars[char_name]
+                class_spec = char['spec'] if char["MS"] == role else char['offspec']
+                mask = self.spec_masks.get((char["class"], class_spec), 0)
+            self.char_masks[key] = mask
+
+        return self.char_masks[key]
+
+    def GetBuffCoverageMask(self, roster: common.Roster) -> int:
+        mask = 0
+        for c, r in zip(roster.char_ids, roster.role_ids):
+            key = (c, r)
+            if key not in self.char_id_masks:
+                self.char_id_masks[key] = self.GetCharBuffMask(self.chars.GetCharName(c), common.WoW.roles[r])
+            mask |= self.char_id_masks[key]
+        return mask
+
+    def CompileLootTables(self):
+        self.item_prios = tmb.BuildPrioIndex(self.tmb, self.contested_items)
+
+        # Each contested item gets a bit
+        self.item_ids = [int(id) for id in self.contested_items]
+        self.loot_masks = {} # K = Char name, V = Bitmask
+        self.loot_id_masks = {} # K = Char id, V = Bitmask
+
+    def GetCharLootMask(self, char_name: str) -> int:
+        if char_name not in self.loot_masks:
+            mask = 0
+            name = char_name.lower()
+            for i, item_id in enumerate(self.item_ids):
+                if self.item_prios.get((name, item_id), -1) > 0:
+                    mask |= 1 << i
+            self.loot_masks[char_name] = mask
+
+        return self.loot_masks[char_name]
+
+    def GetLootCoverageMask(self, roster: common.Roster) -> int:
+        mask = 0
+        for c in roster.char_ids:
+            if c not in self.loot_id_masks:
+                self.loot_id_masks[c] = self.GetCharLootMask(self.chars.GetCharName(c))
+            mask |= self.loot_id_masks[c]
+        return mask
 
     def ReadRosters(self, roster_file):
 
-        rosters = []
+        rosters = common.RosterSet()
         with open(roster_file, 'r') as f:
             dps = True
             signup_indices = [int(a) for a in f.readline().strip('\n').split(' ')]
@@ -108,7 +249,7 @@ class RosterChecker:
 
                     signup_index = math.floor(i / 2)
                     if signup_index >= len(rosters):
-                        rosters.append(common.Roster(self.signups[signup_indices[signup_index]], self.chars, self.tmb, 0))    
+                        rosters.append(common.Roster(self.signups[signup_indices[signup_index]], self.chars, self.tmb, signup_indices[signup_index]))
                     roster = rosters[signup_index]
 
                     role = "dps" if dps else "healer" if i & 1 else "tank"
@@ -130,23 +271,23 @@ class RosterChecker:
                 f.write("G1\tG2\t\t")
             f.write('\n')
 
-            # Print dps
+            # Print dps. Missing chars are left blank
             for i in range(0, 3):
                 for r in rosters:
-                    dps = r.GetCharsByRole("dps")
+                    dps = r.GetCharsByRole("dps") + [""] * 6
                     f.write("{}\t{}\t\t".format(dps[i*2], dps[i*2+1]))
                 f.write('\n')
 
             # print header
-            for i in range(0, 3):
+            for r in rosters:
                 f.write("Tanks\tHeals\t\t")
             f.write('\n')
 
             # Print tanks and healers
             for i in range(0, 2):
                 for r in rosters:
-                    tanks = r.GetCharsByRole("tank")
-                    heals = r.GetCharsByRole("healer")
+                    tanks = r.GetCharsByRole("tank") + [""] * 2
+                    heals = r.GetCharsByRole("healer") + [""] * 2
                     f.write("{}\t{}\t\t".format(tanks[i], heals[i]))
                 f.write('\n')
             
@@ -169,13 +310,15 @@ class RosterChecker:
 
     def CheckRosters(self, rosters: "list[common.Roster]"):
         
+        # Signup order, whatever the order of the file or the generator
         rosters.sort(key=lambda x : x.id)
+        rosters = common.RosterSet.Of(rosters)
         for r in rosters:
             report = self.GenerateReport(r, rosters)
             report.print()
 
             for c, r in r.items():
-                if not self.HasCharSignedUp(self.signups, c):
+                if c not in self.signed_chars:
                     logging.warning("Using Character {} which didn't sing up".format(c))
 
         self.CheckDuplicates(rosters)
@@ -184,6 +327,43 @@ class RosterChecker:
         print("Score: ", score)
         print("Individual scores", iscores)
 
+    """
+    Checks the rosters in the given file without printing anything. Returns a report that can be saved to JSON
+    """
+    def CheckRosterFile(self, roster_file: str) -> dict:
+        report = {"file" : roster_file, "valid" : False, "score" : 0, "iscores" : [], "rosters" : [], "duplicated_chars" : [], "errors" : []}
+        try:
+            rosters = self.ReadRosters(roster_file)
+        except (OSError, ValueError) as e:
+            report["errors"].append("Could not read rosters: {}".format(e))
+            return report
+        except IndexError:
+            report["errors"].append("Unknown signup index. There are {} signups".format(len(self.signups)))
+            return report
+        except KeyError as e:
+            report["errors"].append("Unknown character: {}".format(e))
+            return report
+
+        if len(rosters) == 0:
+            report["errors"].append("No rosters found")
+            return report
+
+        rosters.sort(key=lambda x : x.id)
+        rosters = common.RosterSet.Of(rosters)
+        score, iscores = self.CalcViabilityScoreAlt(rosters)
+        for r, iscore in zip(rosters, iscores):
+            report["rosters"].append(self.GenerateReport(r, rosters).ToDict(iscore))
+
+        duplicates = self.GetDuplicates(rosters)
+        report["duplicated_chars"] = list(duplicates)
+        for c in duplicates:
+            report["errors"].append("Character {} has been rostered twice".format(c))
+
+        report["score"] = score
+        report["iscores"] = iscores
+        report["valid"] = score > 0 and len(duplicates) == 0
+        return report
+
     def GenerateReport(self, r: common.Roster, rosters: "list[common.Roster]") -> Report:
         covered_buffs = self.GetCoveredBuffs(r)
         unavailable_chars = self.GetUnavailableChars(r)
@@ -197,7 +377,7 @@ class RosterChecker:
     def GetUnavailableChars(self, roster: common.Roster):
         active_players = roster.signup.GetActivePlayers()
         unavailable_chars = {}
-        for char in roster.roster:
+        for char in roster:
             discord_id = self.chars.GetDiscordId(char)
             if discord_id not in active_players:
                 unavailable_chars[char] = self.chars[char]
@@ -208,26 +388,17 @@ class RosterChecker:
         r = roster
 
         loot = {}
-        for id, item in self.contested_items.items():
-            users = self.GetItemUsersInRoster(int(id), r)
-            if len(users) > 0:
+        mask = self.GetLootCoverageMask(r)
+        for i, id in enumerate(self.contested_items):
+            loot[id] = None
+            if mask >> i & 1:
+                users = self.GetItemUsersInRoster(self.item_ids[i], r)
                 loot[id] = users[0]
-            else:
-                loot[id] = None
 
         return loot
 
     def GetItemPrio(self, char_name, item_id):
-        for _, char in self.tmb.items():
-            can_receive = item_id in char.wishlist and not char.wishlist[item_id]["is_received"]
-            if char.data["name"].lower() == char_name.lower() and can_receive:
-                return char.wishlist[item_id]["order"]
-        
-        item = self.contested_items[str(item_id)]
-        if char_name in item["needed_by"]:
-            return 20
-
-        return -1
+        return self.item_prios.get((char_name.lower(), item_id), -1)
     
     def GetItemUsers(self, item_id):
         users = []
@@ -239,7 +410,7 @@ class RosterChecker:
     
     def GetItemUsersInRoster(self, item_id, roster: common.Roster):
         users = []
-        for c in roster.roster:
+        for c in roster:
             prio = self.GetItemPrio(c, item_id)
             if prio > 0:
                 users.append({"name" : c, "prio" : prio})
@@ -249,6 +420,9 @@ class RosterChecker:
     
     def GetDuplicatedPlayers(self, roster: common.Roster):
         duplicated_players = {}
+        if len(set(roster.player_ids)) == len(roster.player_ids):
+            return duplicated_players
+        
         for c, _  in roster.items():
             discord_id = self.chars[c]["discord_id"]
             for c2, _  in roster.items():
@@ -258,19 +432,7 @@ class RosterChecker:
         return duplicated_players
 
     def GetDuplicates(self, rosters: "list[common.Roster]"):
-        
-        duplicates = {}
-        size = len(rosters)
-        for i in range(0, size):
-            for j in range(i + 1, size):
-                
-                r1 = rosters[i]
-                r2 = rosters[j]
-                for c1, char1 in r1.items():
-                    for c2, _ in r2.items():
-                        if c1 == c2 :
-                            duplicates[c1] = char1
-        return duplicates
+        return common.RosterSet.Of(rosters).GetDuplicates()
 
     def CheckDuplicates(self, rosters: "list[common.Roster]"):
         
@@ -295,15 +457,12 @@ class RosterChecker:
 
     def GetCoveredBuffs(self, roster: common.Roster) -> dict:
         
-        covered_buffs = {}
-        for name, buff in self.raid_comp_data["buffs"].items():
-            covered_buffs[name] = self.IsBuffCovered(roster, buff)[0]
+        mask = self.GetBuffCoverageMask(roster)
+        covered_buffs = {"buffs" : {}, "debuffs" : {}}
+        for i, (type_, name) in enumerate(self.buff_bits):
+            covered_buffs[type_][name] = bool(mask >> i & 1)
 
-        covered_debuffs = {}
-        for name, debuff in self.raid_comp_data["debuffs"].items():
-            covered_debuffs[name] = self.IsBuffCovered(roster, debuff)[0]
-
-        return {"buffs" : covered_buffs, "debuffs" : covered_debuffs}
+        return covered_buffs
 
     def IsBuffCovered(self, roster: common.Roster, buff: dict) -> bool:
         for c, r in roster.items():
@@ -314,16 +473,19 @@ class RosterChecker:
         return False, None
     
     def CalcBuffCoverageScore(self, roster: common.Roster):
-        covered_buffs = self.GetCoveredBuffs(roster)
+        return self.CalcMaskScore(self.GetBuffCoverageMask(roster))
+    
+    def CalcMaskScore(self, mask: int):
         buff_score = 0
-        for bname, is_covered in covered_buffs["buffs"].items():
-            if is_covered:
-                buff_score = buff_score + self.raid_comp_data["buffs"][bname]["score"]
-
         debuff_score = 0
-        for bname, is_covered in covered_buffs["debuffs"].items():
-            if is_covered:
-                debuff_score = debuff_score + self.raid_comp_data["debuffs"][bname]["score"]
+        while mask:
+            low = mask & -mask
+            bit = low.bit_length() - 1
+            if low & self.buffs_mask:
+                buff_score = buff_score + self.bit_scores[bit]
+            else:
+                debuff_score = debuff_score + self.bit_scores[bit]
+            mask ^= low
 
         return buff_score, debuff_score
     
@@ -334,16 +496,14 @@ class RosterChecker:
     
     def HasCharSignedUp(self, signups: "list[common.Signup]", char: str):
         for s in signups:
-            char_data = self.chars[char]
-            discord_id = char_data['discord_id']
-            if discord_id in s.active_players:
-                spec = s.active_players[discord_id]['spec']
-                if char_data['spec'] in spec:
-                    return True
+            if s.HasCharSignedUp(char):
+                return True
                 
         return False
 
     def HasCharBeenRostered(self, rosters: "list[common.Roster]", char: str):
+        if isinstance(rosters, common.RosterSet):
+            return rosters.IsRostered(char)
         
         for r in rosters:
             if r.ContainsChar(char):
@@ -351,12 +511,17 @@ class RosterChecker:
             
         return False
 
+    """
+    Rating of the char's spec in the given role. Specs missing from the rating table are rated 0
+    """
+    def GetCharRating(self, char: dict, role: str) -> int:
+        return self.raid_comp_data[role + "-rating"].get(self.GetCharSpec(char, role), 0)
+
     def CalcRoleScore(self, r: common.Roster, role: str):
         role_chars = r.GetCharsByRole(role)
         role_score = 0
         for c in role_chars:
-            spec = self.GetCharSpec(self.chars[c], role)
-            role_score = role_score + self.raid_comp_data[role + "-rating"][spec]
+            role_score = role_score + self.GetCharRating(self.chars[c], role)
 
         return role_score
 
@@ -396,33 +561,54 @@ class RosterChecker:
 
         # Global score
         iscores = []
+        roster_set = None
         for i in range(0, len(rosters)):
             r = rosters[i]
-            report = self.GenerateReport(r, rosters)
 
-            # Calc base score
-            iscore = self.CalcBaseViabilityScore(rosters, r, report)
-            if iscore <= 0:
-                iscores.append(0)
+            # A roster's score doesn't depend on the other rosters
+            key = r.GetKey()
+            if key in self.score_cache:
+                self.score_cache.move_to_end(key)
+                self.cache_hits = self.cache_hits + 1
+                iscores.append(self.score_cache[key])
                 continue
 
-            # Calc buff/debuff coverage
-            buff_score, debuff_score = self.CalcBuffCoverageScore(r)
-            iscore = iscore + buff_score + debuff_score
-
-            # Calc roles score
-            tank_score = self.CalcRoleScore(r, "tank")
-            healer_score = self.CalcRoleScore(r, "healer")
-            iscore = iscore + tank_score + healer_score
-            logging.debug("Tank score: {} Healer score: {}".format(tank_score, healer_score))
-
-            # Consider melee and caster balance
-            iscore = max(iscore, 0)            
+            if roster_set is None:
+                roster_set = common.RosterSet.Of(rosters)
+            iscore = self.CalcRosterScoreAlt(r, roster_set)
+            self.cache_misses = self.cache_misses + 1
+            self.score_cache[key] = iscore
+            if len(self.score_cache) > self.cache_size:
+                self.score_cache.popitem(last=False)
             iscores.append(iscore)
 
         score = statistics.harmonic_mean(iscores)
         return score, iscores
     
+    def CalcRosterScoreAlt(self, r: common.Roster, rosters: "list[common.Roster]"):
+        report = self.GenerateReport(r, rosters)
+
+        # Calc base score
+        iscore = self.CalcBaseViabilityScore(rosters, r, report)
+        if iscore <= 0:
+            return 0
+
+        # Calc buff/debuff coverage
+        buff_score, debuff_score = self.CalcBuffCoverageScore(r)
+        iscore = iscore + buff_score + debuff_score
+
+        # Calc roles score
+        tank_score = self.CalcRoleScore(r, "tank")
+        healer_score = self.CalcRoleScore(r, "healer")
+        iscore = iscore + tank_score + healer_score
+        logging.debug("Tank score: {} Healer score: {}".format(tank_score, healer_score))
+
+        # Consider melee and caster balance
+        return max(iscore, 0)
+    
+    def GetCacheStats(self) -> dict:
+        return {"hits" : self.cache_hits, "misses" : self.cache_misses, "size" : len(self.score_cache)}
+    
     def CalcBaseViabilityScore(self, rosters: "list[common.Roster]", r: common.Roster, report: Report):
         iscore = 0
         # Can we even raid with this roster?
@@ -466,33 +652,347 @@ class RosterChecker:
 
         # Punish same class healers/tanks
         healers = r.GetCharsByRole('healer')
-        if self.chars[healers[0]]['class'] == self.chars[healers[1]]['class']:
+        if len(healers) > 1 and self.chars[healers[0]]['class'] == self.chars[healers[1]]['class']:
             iscore = iscore + self.raid_comp_data["misc"]["same-healer"]
         tanks = r.GetCharsByRole('tank')
-        if self.chars[tanks[0]]['class'] == self.chars[tanks[1]]['class']:
+        if len(tanks) > 1 and self.chars[tanks[0]]['class'] == self.chars[tanks[1]]['class']:
             iscore = iscore + self.raid_comp_data["misc"]["same-tank"]
 
         return iscore
 
     def GetCharsInBench(self, r: common.Roster, rosters: "list[common.Roster]"):
         benched_chars = []
+        roster_set = common.RosterSet.Of(rosters)
 
-        for discord_id, p in r.signup.active_players.items():
+        for discord_id in r.signup.active_players:
             
             # Bench cannot contain alts from a given player
             if r.ContainsPlayer(discord_id):
                 continue
 
-            player_chars = self.chars.FindCharacters(discord_id)
-            for char_name, _ in player_chars.items():
-                if not self.HasCharBeenRostered(rosters, char_name) and self.HasCharSignedUp(self.signups, char_name):
+            for char_name in self.chars.player_chars.get(discord_id, {}):
+                if not roster_set.IsRostered(char_name) and char_name in self.signed_chars:
                     benched_chars.append(char_name)
 
         return benched_chars
 
+class RosterScoreState:
+
+    def __init__(self, roster_checker: RosterChecker, roster: common.Roster):
+        self.rc = roster_checker
+        self.roster = roster
+
+        self.buff_counts = [0] * len(self.rc.buff_bits)
+        self.buff_mask = 0
+        self.loot_counts = [0] * len(self.rc.item_ids)
+        self.loot_mask = 0
+        self.player_counts = {} # K = Discord id, V = Chars of this player in the roster
+
+        self.char_amount = 0
+        self.duplicated_players = 0
+        self.unavailable_chars = 0
+        self.soakers = 0
+        self.char_score = 0
+        self.rating_score = 0
+
+        for c, role in roster.items():
+            self.Add(c, role)
+
+    def Add(self, char_name: str, role: str):
+        rc = self.rc
+        signup = self.roster.signup
+        char = rc.chars[char_name]
+        discord_id = char["discord_id"]
+
+        self.char_amount = self.char_amount + 1
+        self.buff_counts, self.buff_mask = RosterScoreState.AddMask(self.buff_counts, self.buff_mask, rc.GetCharBuffMask(char_name, role), 1)
+        self.loot_counts, self.loot_mask = RosterScoreState.AddMask(self.loot_counts, self.loot_mask, rc.GetCharLootMask(char_name), 1)
+
+        count = self.player_counts.get(discord_id, 0) + 1
+        self.player_counts[discord_id] = count
+        if count == 2:
+            self.duplicated_players = self.duplicated_players + 1
+
+        if discord_id not in signup.active_players:
+            self.unavailable_chars = self.unavailable_chars + 1
+        if RosterScoreState.IsSoaker(char, role):
+            self.soakers = self.soakers + 1
+
+        self.char_score = self.char_score + self.CalcCharScore(char, role)
+        if role != "dps":
+            self.rating_score = self.rating_score + rc.GetCharRating(char, role)
+
+    def Remove(self, char_name: str, role: str):
+        rc = self.rc
+        signup = self.roster.signup
+        char = rc.chars[char_name]
+        discord_id = char["discord_id"]
+
+        self.char_amount = self.char_amount - 1
+        self.buff_counts, self.buff_mask = RosterScoreState.AddMask(self.buff_counts, self.buff_mask, rc.GetCharBuffMask(char_name, role), -1)
+        self.loot_counts, self.loot_mask = RosterScoreState.AddMask(self.loot_counts, self.loot_mask, rc.GetCharLootMask(char_name), -1)
+
+        count = self.player_counts[discord_id] - 1
+        self.player_counts[discord_id] = count
+        if count == 1:
+            self.duplicated_players = self.duplicated_players - 1
+
+        if discord_id not in signup.active_players:
+            self.unavailable_chars = self.unavailable_chars - 1
+        if RosterScoreState.IsSoaker(char, role):
+            self.soakers = self.soakers - 1
+
+        self.char_score = self.char_score - self.CalcCharScore(char, role)
+        if role != "dps":
+            self.rating_score = self.rating_score - rc.GetCharRating(char, role)
+
+    def AddMask(counts: list, mask: int, char_mask: int, delta: int):
+        while char_mask:
+            low = char_mask & -char_mask
+            bit = low.bit_length() - 1
+            counts[bit] = counts[bit] + delta
+            if counts[bit] > 0:
+                mask |= low
+            else:
+                mask &= ~low
+            char_mask ^= low
+        return counts, mask
+
+    def IsSoaker(char: dict, role: str):
+        return char['class'] == "Rogue" or (char['class'] == "Priest" and role == "dps")
+
+    def CalcCharScore(self, char: dict, role: str):
+        rc = self.rc
+        signup = self.roster.signup
+        misc = rc.raid_comp_data["misc"]
+
+        score = 0
+        if char["MS"] == role:
+            score = score + misc["main-spec"]
+        if signup.IsShortRun() and char["is_main"]:
+            score = score + misc["main-in-short-run"]
+        if not rc.HasCharSignedUp(rc.signups, char["name"]):
+            score = score - misc["unsigned-char"]
+        if char["name"] in rc.inactive_chars:
+            score = score + misc["inactive-char"]
+        if char["discord_id"] in signup.players and signup.IsBenched(char["discord_id"]):
+            score = score + misc["benched-char"]
+        return score
+
+    def IsRaidViable(self):
+        soaker_req = not self.roster.signup.RequiresSoaker() or self.soakers > 0
+        return self.char_amount == 10 and soaker_req and self.unavailable_chars == 0 and self.duplicated_players == 0
+
+    def CalcScore(self):
+        rc = self.rc
+        r = self.roster
+        misc = rc.raid_comp_data["misc"]
+
+        # Same as RosterChecker.CalcViabilityScoreAlt
+        if not self.IsRaidViable():
+            return 0
+        
+        iscore = 1000 + misc["item-covered"] * bin(self.loot_mask).count("1")
+        if r.signup.RequiresMotalStrike():
+            iscore = iscore + misc["mortal-strike-covered"]
+        iscore = iscore + self.char_score
+
+        # Punish same class healers/tanks
+        healers = r.GetCharsByRole('healer')
+        if len(healers) > 1 and rc.chars[healers[0]]['class'] == rc.chars[healers[1]]['class']:
+            iscore = iscore + misc["same-healer"]
+        tanks = r.GetCharsByRole('tank')
+        if len(tanks) > 1 and rc.chars[tanks[0]]['class'] == rc.chars[tanks[1]]['class']:
+            iscore = iscore + misc["same-tank"]
+
+        if iscore <= 0:
+            return 0
+        
+        buff_score, debuff_score = rc.CalcMaskScore(self.buff_mask)
+        iscore = iscore + buff_score + debuff_score + self.rating_score
+        return max(iscore, 0)
+
+class ScoreState:
+
+    """
+    Keeps the score of a set of rosters up to date as characters are swapped, moved or change role.
+    The given rosters are modified in place. Every move can be undone by applying the inverse move.
+    """
+    def __init__(self, roster_checker: RosterChecker, rosters: "list[common.Roster]"):
+        self.rc = roster_checker
+        self.rosters = rosters
+        self.states = [RosterScoreState(roster_checker, r) for r in rosters]
+        self.iscores = [s.CalcScore() for s in self.states]
+
+    def GetScore(self):
+        return statistics.harmonic_mean(self.iscores), list(self.iscores)
+    
+    def UpdateScores(self, *indices):
+        for i in indices:
+            self.iscores[i] = self.states[i].CalcScore()
+        return self.GetScore()
+    
+    def RemoveChar(self, i: int, char_name: str) -> str:
+        role = self.rosters[i].UnrosterChar(char_name)
+        self.states[i].Remove(char_name, role)
+        return role
+    
+    def AddChar(self, i: int, char_name: str, role: str):
+        if char_name in self.rosters[i]:
+            self.RemoveChar(i, char_name)
+        self.rosters[i].RosterChar(char_name, role)
+        self.states[i].Add(char_name, role)
+
+    """
+    Replaces char_a in roster i by char_b, with the same role.
+    If char_b is rostered in another roster, it's replaced by char_a there.
+    """
+    def Swap(self, i: int, char_a: str, char_b: str):
+        if char_a == char_b:
+            return self.GetScore()
+        
+        j = self.FindChar(char_b)
+        role_a = self.RemoveChar(i, char_a)
+        if j is not None:
+            role_b = self.RemoveChar(j, char_b)
+            self.AddChar(j, char_a, role_b)
+        self.AddChar(i, char_b, role_a)
+
+        if j is not None:
+            return self.UpdateScores(i, j)
+        return self.UpdateScores(i)
+
+    """
+    Moves char from roster i to roster j, keeping its role
+    """
+    def Move(self, i: int, j: int, char_name: str):
+        role = self.RemoveChar(i, char_name)
+        self.AddChar(j, char_name, role)
+        return self.UpdateScores(i, j)
+
+    def ChangeRole(self, i: int, char_name: str, role: str):
+        self.RemoveChar(i, char_name)
+        self.AddChar(i, char_name, role)
+        return self.UpdateScores(i)
+    
+    def FindChar(self, char_name: str):
+        if isinstance(self.rosters, common.RosterSet):
+            rosters = self.rosters.char_rosters.get(char_name)
+            return min([i for i, r in enumerate(self.rosters) if r in rosters]) if rosters else None
+
+        for i, r in enumerate(self.rosters):
+            if char_name in r:
+                return i
+        return None
+
+def Instrument():
+    profiling.Instrument(RosterChecker, ["__init__", "ReadRosters", "CheckRosters", "GenerateReport", "GetCoveredBuffs", "GetUnavailableChars", "GetDuplicatedPlayers",
+                                         "GetLootCoverage", "GetClassDiversity", "GetCharsInBench", "CalcViabilityScoreAlt", "CalcRosterScoreAlt", "CalcBaseViabilityScore", "CheckRosterFile",
+                                         "CalcBuffCoverageScore", "CalcRoleScore"])
+    profiling.Instrument(GuildContext, ["__init__"])
+    profiling.Instrument(cache.InputCache, ["__init__", "Save"])
+    profiling.Instrument(common.CharacterBD, ["__init__"])
+    profiling.Instrument(common.Signup, ["__init__"])
+    profiling.Instrument(common.Roster, ["Encode", "Decode"])
+    profiling.Instrument(tmb, ["LoadFromFile", "calculate_update_prios", "BuildPrioIndex"])
+
 # Alg. Notes
 # Config file for score system
 
+# Per process checker, shared by every file checked in it
+worker_rc = None
+
+def InitWorker(args):
+    global worker_rc
+    if args.profile:
+        profiling.Enable()
+        Instrument()
+    if worker_rc is None:
+        worker_rc = RosterChecker(GuildContext.FromArgs(args))
+
+"""
+A file that can't be checked doesn't stop the rest of the batch
+"""
+def CheckRosterFile(roster_file: str) -> dict:
+    try:
+        return worker_rc.CheckRosterFile(roster_file)
+    except Exception as e:
+        return {"file" : roster_file, "valid" : False, "score" : 0, "iscores" : [], "rosters" : [], "duplicated_chars" : [],
+                "errors" : ["Could not check rosters: {}".format(repr(e))]}
+
+"""
+Runs in a worker process. Returns the report and what the profiler recorded while checking the file
+"""
+def CheckRosterFileInWorker(roster_file: str) -> dict:
+    profile_stats = profiling.GetStats()
+    report = CheckRosterFile(roster_file)
+    return {"report" : report, "profile" : profiling.Diff(profiling.GetStats(), profile_stats)}
+
+"""
+Returns the roster files in the given paths. Directories are expanded to the .txt files in them
+"""
+def GetRosterFiles(paths: "list[str]") -> "list[str]":
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(os.path.join(path, f) for f in os.listdir(path) if f.endswith(".txt") and os.path.isfile(os.path.join(path, f))))
+        else:
+            files.append(path)
+    return files
+
+"""
+Checks every roster file in parallel, writes a JSON report for each one to the report dir and prints them ranked by score
+"""
+def CheckRostersInBatch(args, rc: RosterChecker):
+    files = GetRosterFiles(args.batch)
+    if len(files) == 0:
+        logging.error("No roster files found in {}".format(args.batch))
+        return
+
+    # Workers inherit the checker when forked. Otherwise they load it by InitWorker
+    global worker_rc
+    worker_rc = rc
+    threads_amount = max(min(args.j, len(files)), 1)
+    if threads_amount == 1:
+        reports = [CheckRosterFile(f) for f in files]
+    else:
+        ctx = multiprocessing.get_context(args.start_method)
+        if ctx.get_start_method() == "fork":
+            rc.context.Share()
+        with ctx.Pool(threads_amount, initializer=InitWorker, initargs=(args,)) as pool:
+            results = pool.map(CheckRosterFileInWorker, files)
+        reports = []
+        for res in results:
+            profiling.Merge(res["profile"])
+            reports.append(res["report"])
+
+    os.makedirs(args.report_dir, exist_ok=True)
+    names = {"summary"} # summary.json is the ranking of every file
+    summary = []
+    for report in reports:
+        name = os.path.splitext(os.path.basename(report["file"]))[0]
+        unique_name = name
+        n = 1
+        while unique_name in names:
+            unique_name = "{}-{}".format(name, n)
+            n = n + 1
+        names.add(unique_name)
+
+        report_file = os.path.join(args.report_dir, unique_name + ".json")
+        with open(report_file, 'w', encoding='utf8') as f:
+            json.dump(report, f, indent=4)
+        summary.append({"file" : report["file"], "report" : report_file, "valid" : report["valid"], "score" : report["score"],
+                        "iscores" : report["iscores"], "errors" : len(report["errors"]) + sum(len(r["errors"]) for r in report["rosters"])})
+
+    summary.sort(key=lambda x : x["score"], reverse=True)
+    with open(os.path.join(args.report_dir, "summary.json"), 'w', encoding='utf8') as f:
+        json.dump(summary, f, indent=4)
+
+    print("{0:<6s}{1:>10s}{2:>7s}{3:>8s}  {4}".format("Rank", "Score", "Valid", "Errors", "File"))
+    for i, entry in enumerate(summary):
+        print("{0:<6d}{1:>10.2f}{2:>7s}{3:>8d}  {4}".format(i + 1, entry["score"], "yes" if entry["valid"] else "no", entry["errors"], entry["file"]))
+    print("Reports saved to {}".format(args.report_dir))
+
 #TODO: Print benched players in out filel
 def main():
 
@@ -507,15 +1007,39 @@ def main():
     parser.add_argument("-o", default="out.txt")
     parser.add_argument("-v", default=logging.INFO)
     parser.add_argument("-s", default=0)
+    parser.add_argument("--profile", action="store_true", help="Print how much time was spent on each stage")
+    parser.add_argument("--profile-out", default="profile.json")
+    parser.add_argument("--input-cache", default=None, help="File where parsed inputs are kept between runs. Defaults to a file in ~/.cache/rostermaster. "
+                        "It's a pickle, which can run arbitrary code when loaded, so only use files written by yourself")
+    parser.add_argument("--no-input-cache", action="store_true", help="Parse every input from scratch")
+    parser.add_argument("--batch", nargs="+", default=None, metavar="PATH", help="Check these roster files, or every .txt file in these dirs, without asking for input")
+    parser.add_argument("--report-dir", default="reports", help="Dir where --batch saves a JSON report per roster file and a summary")
+    parser.add_argument("-j", default=os.cpu_count() or 1, type=int, help="Processes used by --batch")
+    parser.add_argument("--start-method", default=None, choices=multiprocessing.get_all_start_methods())
     args = parser.parse_args()
 
     logging.basicConfig(format='%(levelname)s: %(message)s', level=logging.INFO)
+    if args.profile:
+        profiling.Enable()
+        Instrument()
+
+    rc = RosterChecker(GuildContext.FromArgs(args))
+    if args.batch:
+        CheckRostersInBatch(args, rc)
+        if args.profile:
+            stats = profiling.GetStats()
+            profiling.PrintTable(stats)
+            profiling.Save(stats, args.profile_out)
+        return
 
-    rc = RosterChecker(args.raid_comp_data, args.characters_db, args.inactive_chars, args.tmb_file, args.contested_items, args.sfp)
     rosters = rc.ReadRosters(args.r)
     rc.CheckRosters(rosters)
     if args.s:
         rc.SaveRostersToFile(rosters, args.o)
+    if args.profile:
+        stats = profiling.GetStats()
+        profiling.PrintTable(stats)
+        profiling.Save(stats, args.profile_out)
     input("-------------- Press Enter --------------")
     rc.PrintPingMessages(rosters)
 
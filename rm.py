@@ -1,26 +1,36 @@
 
 import argparse
-import json
+import heapq
 import random
 import common
 import logging
+import math
 import multiprocessing
+import profiling
+import sys
+import time
 
-import tmb
+from queue import Empty
 
-from rc import RosterChecker
+import rc as roster_checker
+
+from guild import GuildContext
+from rc import RosterChecker, RosterScoreState, ScoreState
 
 class RosterMaster:
 
-    def __init__(self, charDB_file, tmb_file, contested_items_file, sfp):
-        self.chars = common.CharacterBD(charDB_file)
-        self.contested_items = json.load(open(contested_items_file))
-        self.tmb = tmb.ReadDataFromJson(tmb.GetDataFromFile(tmb_file))
-        self.signups = common.Signup.LoadSignups(self.chars, sfp)
+    def __init__(self, context: GuildContext):
+        self.context = context
+        self.chars = context.chars
+        self.contested_items = context.contested_items
+        self.tmb = context.tmb
+        self.signups = context.signups
+        self.feasible_sampler = None
+        self.weighted_sampler = None
         
     def GenerateRandomRosters(self):
 
-        rosters = []
+        rosters = common.RosterSet()
         for id in range(0, len(self.signups)):
             s = self.signups[id]
             rosters.append(common.Roster(s, self.chars, self.tmb, id))
@@ -31,24 +41,147 @@ class RosterMaster:
 
         return rosters
 
-    def GenerateRandomRostersV2(self):
-        pass
+    def GetFeasibleSampler(self) -> "FeasibleSampler":
+        if self.feasible_sampler is None:
+            self.feasible_sampler = FeasibleSampler(self)
+        return self.feasible_sampler
+
+    def GenerateFeasibleRosters(self) -> common.RosterSet:
+        return self.GetFeasibleSampler().Sample()
+
+    def GetWeightedSampler(self, rc: RosterChecker, temperature: float) -> "WeightedSampler":
+        if self.weighted_sampler is None or self.weighted_sampler.rc is not rc or self.weighted_sampler.temperature != temperature:
+            self.weighted_sampler = WeightedSampler(self, rc, temperature)
+        return self.weighted_sampler
 
-    def AssignByRole(self, rosters: "list[common.Roster]", role: str, min_amount: int):
+    def GenerateWeightedRosters(self, rc: RosterChecker, temperature: float) -> common.RosterSet:
+        return self.GetWeightedSampler(rc, temperature).Sample()
+
+    def SampleRosters(self, sampler: str = "feasible", rc: RosterChecker = None, temperature: float = 50) -> common.RosterSet:
+        if sampler == "uniform":
+            return self.GenerateRandomRosters()
+        if sampler == "weighted":
+            return self.GenerateWeightedRosters(rc, temperature)
+        return self.GenerateFeasibleRosters()
+
+    """
+    Returns a list of reasons why no valid set of rosters can be made for the current signups, empty if none were found
+    """
+    def CheckFeasibility(self) -> "list[str]":
+        return self.GetFeasibleSampler().CheckFeasibility()
+
+    def GenerateValidRosters(self, rc: RosterChecker, max_tries: int = 1000):
+        for i in range(0, max_tries):
+            rosters = self.GenerateFeasibleRosters()
+            score, iscores = rc.CalcViabilityScoreAlt(rosters)
+            if score > 0:
+                break
+        return rosters
+
+    def AnnealRosters(self, rc: RosterChecker, iterations: int, t_start: float, t_end: float, samples: int = 20, progress: "Progress" = None):
+        if progress is None:
+            progress = Progress(iterations)
+
+        rosters = self.GenerateValidRosters(rc)
+        state = ScoreState(rc, rosters)
+        score, iscores = state.GetScore()
+        best = {"rosters" : [r.Copy() for r in rosters], "score" : score, "iscores" : iscores}
+
+        # Score convergence. List of (seconds, iteration, best score)
+        history = [(0, 0, score)]
+        sample = 1
+        i = 0
+        while progress.Continue(i, best):
+            done = progress.GetFraction(i)
+            temp = t_start * (t_end / t_start) ** done
+            undo = self.DoRandomMove(state)
+            if undo:
+                new_score, new_iscores = state.GetScore()
+                profiling.Count("rm.roster_sets")
+                if new_score == 0:
+                    profiling.Count("rm.invalid_roster_sets")
+                if new_score >= score or random.random() < math.exp((new_score - score) / temp):
+                    score = new_score
+                    if score > best["score"]:
+                        best = {"rosters" : [r.Copy() for r in rosters], "score" : score, "iscores" : new_iscores}
+                else:
+                    undo()
+
+            i = i + 1
+            if progress.GetFraction(i) >= sample / samples:
+                history.append((progress.GetElapsed(), i, best["score"]))
+                sample = sample + 1
+
+        best["history"] = history
+        return best
+    
+    """
+    Applies a random swap/move to the rosters in state. Returns a function that undoes it, or None if no move was made.
+    """
+    def DoRandomMove(self, state: ScoreState):
+        rosters = state.rosters
+        i = random.randrange(0, len(rosters))
+        r = rosters[i]
+        if r.GetPlayerAmount() == 0:
+            return None
+        
+        a = random.choice(r.GetChars())
+        role_a = r[a]
+        move = random.random()
+        
+        # Swap with a signed up char from the bench or another roster
+        if move < 0.5:
+            pool = r.signup.GetActiveCharsByRole(role_a)
+            if len(pool) == 0:
+                return None
+            
+            b = random.choice(list(pool))
+            j = state.FindChar(b)
+            if b == a or j == i or (j is not None and not self.chars[a][rosters[j][b]]):
+                return None
+            
+            state.Swap(i, a, b)
+            return lambda: state.Swap(i, b, a)
+        
+        # Swap with a char with the same role from another roster
+        elif move < 0.8:
+            j = random.randrange(0, len(rosters))
+            chars = rosters[j].GetCharsByRole(role_a)
+            if j == i or len(chars) == 0:
+                return None
+            
+            b = random.choice(chars)
+            state.Swap(i, a, b)
+            return lambda: state.Swap(i, b, a)
+        
+        # Exchange roles within the roster
+        else:
+            b = random.choice(r.GetChars())
+            role_b = r[b]
+            if role_a == role_b or not self.chars[a][role_b] or not self.chars[b][role_a]:
+                return None
+            
+            state.ChangeRole(i, a, role_b)
+            state.ChangeRole(i, b, role_a)
+            def undo():
+                state.ChangeRole(i, a, role_a)
+                state.ChangeRole(i, b, role_b)
+            return undo
+
+    def AssignByRole(self, rosters: common.RosterSet, role: str, min_amount: int):
 
         # Start with roster with the fewer signups
         rosters.sort(key=lambda x : len(x.signup.GetActivePlayers()))
 
         for r in rosters:
-            chars = r.signup.GetActiveCharsByRole(role)
-            chars_copy = chars.copy()
+            pool = r.signup.GetActiveCharsByRole(role)
+            chars = pool.copy()
 
             # Remove players already rostered
-            for p in chars_copy:
+            for p in pool:
                 # Remove character if in other rosters
-                for roster in rosters:
-                    if p in roster and p in chars:
-                        chars.pop(p)
+                if rosters.IsRostered(p) and p in chars:
+                    chars.pop(p)
 
                 # Remove char from this roster if in another char already
                 if r.ContainsPlayer(self.chars[p]['discord_id']) and p in chars:
@@ -70,6 +203,1138 @@ class RosterMaster:
                         if alt in chars:
                             chars.pop(alt)
 
+class FeasibleSampler:
+
+    # Kinds of slot in a roster. Soakers and Mortal Strike providers fill dps slots
+    kinds = ["tank", "healer", "dps", "soaker", "mortal-strike"]
+    kind_roles = ["tank", "healer", "dps", "dps", "dps"]
+    tank, healer, dps, soaker, mortal_strike = range(0, 5)
+
+    """
+    Generates random rosters which are valid whenever possible. The most constrained slot is filled first, and a char
+    is only picked if every roster can still be completed afterwards, as long as the players left for each roster
+    satisfy Hall's condition. Soakers and Mortal Strike providers are reserved in the signups requiring them.
+    """
+    def __init__(self, rm: RosterMaster):
+        self.rm = rm
+        self.chars = rm.chars
+        self.discord_ids = {name : char["discord_id"] for name, char in rm.chars.items()}
+        raid_comp_data = rm.context.raid_comp_data
+        ms_specs = set(raid_comp_data["debuffs"]["mortal-strike"]["provided_by"]) if raid_comp_data else set()
+
+        self.needs = [] # K = Roster index, V = Slots to fill per kind
+        self.eligible = [] # K = Roster index, V = {K = Char name, V = Kinds mask}
+        self.candidates = [] # K = Roster index, V = Eligible chars per kind
+        self.masks = [] # K = Roster index, V = {K = Discord id, V = Kinds mask of the player's chars}
+        self.counts = [] # K = Roster index, V = Amount of players per kinds mask
+        self.avail = [] # K = Roster index, V = Amount of players per kind
+        for s in rm.signups:
+            eligible = {}
+            for name, char in s.GetActiveChars().items():
+                mask = 0
+                for k in range(0, len(FeasibleSampler.kinds)):
+                    if FeasibleSampler.CanFill(char, k, ms_specs):
+                        mask |= 1 << k
+                if mask:
+                    eligible[name] = mask
+
+            need = [2, 2, 6, 0, 0]
+            if s.RequiresSoaker():
+                need[FeasibleSampler.soaker] = 1
+                need[FeasibleSampler.dps] = need[FeasibleSampler.dps] - 1
+            if s.RequiresMotalStrike() and any(m >> FeasibleSampler.mortal_strike & 1 for m in eligible.values()):
+                need[FeasibleSampler.mortal_strike] = 1
+                need[FeasibleSampler.dps] = need[FeasibleSampler.dps] - 1
+
+            masks = {}
+            for name, mask in eligible.items():
+                discord_id = self.chars.GetDiscordId(name)
+                masks[discord_id] = masks.get(discord_id, 0) | mask
+
+            counts = [0] * (1 << len(FeasibleSampler.kinds))
+            for mask in masks.values():
+                counts[mask] = counts[mask] + 1
+
+            self.needs.append(need)
+            self.eligible.append(eligible)
+            self.candidates.append([[name for name, mask in eligible.items() if mask >> k & 1] for k in range(0, len(FeasibleSampler.kinds))])
+            self.masks.append(masks)
+            self.counts.append(counts)
+            self.avail.append([sum(c for m, c in enumerate(counts) if m >> k & 1) for k in range(0, len(FeasibleSampler.kinds))])
+
+    def CanFill(char: dict, kind: int, ms_specs: set) -> bool:
+        role = FeasibleSampler.kind_roles[kind]
+        if not char[role]:
+            return False
+        if kind == FeasibleSampler.soaker:
+            return RosterScoreState.IsSoaker(char, role)
+        if kind == FeasibleSampler.mortal_strike:
+            spec = char["spec"] if char.get("MS") == role else char["offspec"]
+            return char["class"] + ":" + spec in ms_specs
+        return True
+
+    """
+    Whether the slots left can be filled with different players, given the amount of players per kinds mask
+    """
+    def CanComplete(need: "list[int]", avail: "list[int]", counts: "list[int]") -> bool:
+        needed = [k for k in range(0, len(need)) if need[k] > 0]
+
+        # Enough if, from the scarcest kind up, each kind has as many players as the slots of it and every scarcer kind
+        needed.sort(key=lambda k : avail[k])
+        demand = 0
+        for k in needed:
+            demand = demand + need[k]
+            if avail[k] < demand:
+                break
+        else:
+            return True
+
+        # Hall's condition, for every subset of the kinds still needed
+        needed_mask = sum(1 << k for k in needed)
+        present = [(m, c) for m, c in enumerate(counts) if c > 0]
+        subset = needed_mask
+        while subset:
+            demand = sum(need[k] for k in needed if subset >> k & 1)
+            supply = sum(c for m, c in present if m & subset)
+            if supply < demand:
+                return False
+            subset = (subset - 1) & needed_mask
+
+        return True
+
+    """
+    Returns the rosters in the same order as the signups. Picks that look fine for each roster on its own can still leave
+    two rosters fighting for the same char, so it starts over when a roster can't be completed, up to max_tries times.
+    If no valid set was found, the last one is returned, with some incomplete rosters.
+    """
+    def Sample(self, max_tries: int = 10) -> common.RosterSet:
+        for i in range(0, max_tries):
+            rosters, complete = self.SampleOnce()
+            if complete:
+                break
+            profiling.Count("rm.feasible_sampler_retries")
+        return rosters
+
+    def SampleOnce(self):
+        rm = self.rm
+        rosters = common.RosterSet([common.Roster(s, rm.chars, rm.tmb, id) for id, s in enumerate(rm.signups)])
+        self.Reset(rosters)
+        complete = self.Fill(rosters)
+        return rosters, complete
+
+    """
+    Starts filling the given empty rosters, in the same order as the signups
+    """
+    def Reset(self, rosters: common.RosterSet):
+        self.need = [list(n) for n in self.needs]
+        self.player_masks = [dict(m) for m in self.masks]
+        self.player_counts = [list(c) for c in self.counts]
+        self.player_avail = [list(a) for a in self.avail]
+        self.used = set()
+        self.rostered_players = [set() for r in rosters]
+
+    """
+    Rosters char c in roster i with the given role, if there's a slot left for it and every roster can still be completed afterwards.
+    Used to keep chars picked beforehand, before filling the rest
+    """
+    def Keep(self, rosters: common.RosterSet, i: int, c: str, role: str) -> bool:
+        if c in self.used or self.discord_ids[c] in self.rostered_players[i]:
+            return False
+
+        # Soaker and Mortal Strike slots first, they're harder to fill
+        mask = self.eligible[i].get(c, 0)
+        for k in reversed(range(0, len(FeasibleSampler.kinds))):
+            if FeasibleSampler.kind_roles[k] == role and mask >> k & 1 and self.need[i][k] > 0 and self.Assign(rosters, i, k, c):
+                return True
+        return False
+
+    """
+    Fills every slot left. Returns whether every roster could be completed
+    """
+    def Fill(self, rosters: common.RosterSet) -> bool:
+        complete = True
+        while True:
+            slot = self.PickSlot()
+            if slot is None:
+                break
+
+            i, k = slot
+            candidates = [c for c in self.candidates[i][k] if c not in self.used and self.discord_ids[c] not in self.rostered_players[i]]
+            for c in self.OrderCandidates(rosters[i], k, candidates):
+                if self.Assign(rosters, i, k, c):
+                    break
+            else:
+
+                # Mortal Strike is only nice to have
+                if k == FeasibleSampler.mortal_strike:
+                    self.need[i][k] = self.need[i][k] - 1
+                    self.need[i][FeasibleSampler.dps] = self.need[i][FeasibleSampler.dps] + 1
+                elif candidates:
+                    self.Assign(rosters, i, k, candidates[0], check=False)
+                    complete = False
+                else:
+                    self.need[i][k] = 0
+                    complete = False
+
+        return complete
+
+    """
+    Returns (roster index, kind) of the slot with the fewest players left to fill it, or None if every slot is filled
+    """
+    def PickSlot(self):
+        slots = []
+        min_slack = None
+        for i, need in enumerate(self.need):
+            for k, n in enumerate(need):
+                if n > 0:
+                    slack = self.player_avail[i][k] - n
+                    if min_slack is None or slack < min_slack:
+                        min_slack = slack
+                        slots = [(i, k)]
+                    elif slack == min_slack:
+                        slots.append((i, k))
+
+        return random.choice(slots) if slots else None
+
+    """
+    Yields the candidates for a slot in the order they should be tried. Uniformly random
+    """
+    def OrderCandidates(self, roster: common.Roster, kind: int, candidates: "list[str]"):
+        candidates = list(candidates)
+        while candidates:
+            j = random.randrange(0, len(candidates))
+            candidates[j], candidates[-1] = candidates[-1], candidates[j]
+            yield candidates.pop()
+
+    """
+    Rosters char c in slot (i, k), unless check is set and that would leave a roster without enough players
+    """
+    def Assign(self, rosters: common.RosterSet, i: int, k: int, c: str, check: bool = True) -> bool:
+        discord_id = self.discord_ids[c]
+        player_chars = self.chars.player_chars[discord_id]
+
+        # Masks of this player which change in each roster. The player can't be picked again for roster i
+        changes = [(i, self.player_masks[i].get(discord_id, 0), 0)]
+        for j, eligible in enumerate(self.eligible):
+            if j != i and c in eligible and discord_id not in self.rostered_players[j]:
+                mask = 0
+                for name in player_chars:
+                    if name != c and name not in self.used:
+                        mask |= eligible.get(name, 0)
+                changes.append((j, self.player_masks[j].get(discord_id, 0), mask))
+
+        self.need[i][k] = self.need[i][k] - 1
+        for j, old, new in changes:
+            self.MoveCount(j, old, new)
+
+        if check:
+            for j, _, _ in changes:
+                if not FeasibleSampler.CanComplete(self.need[j], self.player_avail[j], self.player_counts[j]):
+                    self.need[i][k] = self.need[i][k] + 1
+                    for j, old, new in changes:
+                        self.MoveCount(j, new, old)
+                    return False
+
+        for j, _, new in changes:
+            self.player_masks[j][discord_id] = new
+        self.used.add(c)
+        self.rostered_players[i].add(discord_id)
+        rosters[i].RosterChar(c, FeasibleSampler.kind_roles[k])
+        return True
+
+    def MoveCount(self, j: int, old: int, new: int):
+        counts = self.player_counts[j]
+        avail = self.player_avail[j]
+        if old:
+            counts[old] = counts[old] - 1
+        if new:
+            counts[new] = counts[new] + 1
+        for k in range(0, len(avail)):
+            avail[k] = avail[k] + (new >> k & 1) - (old >> k & 1)
+
+    """
+    Looks for reasons why no valid set of rosters could exist. Returns a list of problems, empty if none were found
+    """
+    def CheckFeasibility(self) -> "list[str]":
+        problems = []
+
+        # Every roster needs enough different players. Mortal Strike isn't required
+        for i, s in enumerate(self.rm.signups):
+            need = list(self.needs[i])
+            need[FeasibleSampler.dps] = need[FeasibleSampler.dps] + need[FeasibleSampler.mortal_strike]
+            need[FeasibleSampler.mortal_strike] = 0
+            counts = self.counts[i]
+            needed = [k for k in range(0, len(need)) if need[k] > 0]
+            needed_mask = sum(1 << k for k in needed)
+            subset = needed_mask
+            while subset:
+                demand = sum(need[k] for k in needed if subset >> k & 1)
+                supply = sum(c for m, c in enumerate(counts) if m & subset)
+                if supply < demand:
+                    kinds = [FeasibleSampler.kinds[k] for k in needed if subset >> k & 1]
+                    kinds = kinds[0] if len(kinds) == 1 else ", ".join(kinds[:-1]) + " or " + kinds[-1]
+                    problems.append("{}: needs {} players for {} slots, but only {} can fill them".format(s.title, demand, kinds, supply))
+                    break
+                subset = (subset - 1) & needed_mask
+
+        # Every slot needs a different char
+        slots = []
+        for i, need in enumerate(self.needs):
+            for k, n in enumerate(need):
+                kind = FeasibleSampler.dps if k == FeasibleSampler.mortal_strike else k
+                slots.extend([(i, kind)] * n)
+
+        matched = {} # K = Char name, V = Slot index
+        filled = sum(1 for slot in range(0, len(slots)) if self.Augment(slots, matched, slot, set()))
+        if filled < len(slots):
+            problems.append("Only {} of the {} slots can be filled with different characters".format(filled, len(slots)))
+
+        return problems
+
+    """
+    Looks for an augmenting path from the given slot in the slots to chars matching. Returns whether one was found
+    """
+    def Augment(self, slots: list, matched: dict, slot: int, visited: set) -> bool:
+        i, k = slots[slot]
+        for c in self.candidates[i][k]:
+            if c not in visited:
+                visited.add(c)
+                if c not in matched or self.Augment(slots, matched, matched[c], visited):
+                    matched[c] = slot
+                    return True
+        return False
+
+class WeightedSampler(FeasibleSampler):
+
+    """
+    Same as FeasibleSampler, but tries first the chars which add the most to their roster: buffs and loot it doesn't cover yet,
+    main spec, tank and healer ratings and the rest of the per char bonuses of the score. Chars are drawn with probability
+    proportional to exp(gain / temperature), so low temperatures are almost greedy and high ones almost uniform.
+    A temperature of 0 always tries the best char first.
+    """
+    def __init__(self, rm: RosterMaster, rc: RosterChecker, temperature: float):
+        FeasibleSampler.__init__(self, rm)
+        self.rc = rc
+        self.temperature = temperature
+        self.misc = rc.raid_comp_data["misc"]
+        self.char_scores = {} # K = (Roster index, char name, role), V = Gain which doesn't depend on the rest of the roster
+
+        # Only used for their CalcCharScore, which just looks at the signup
+        self.score_states = [RosterScoreState(rc, common.Roster(s, rm.chars, rm.tmb, id)) for id, s in enumerate(rm.signups)]
+
+    def GetCharScore(self, i: int, char_name: str, role: str) -> float:
+        key = (i, char_name, role)
+        if key not in self.char_scores:
+            rc = self.rc
+            char = rc.chars[char_name]
+            score = self.score_states[i].CalcCharScore(char, role)
+            if role != "dps":
+                score = score + rc.GetCharRating(char, role)
+            self.char_scores[key] = score
+        return self.char_scores[key]
+
+    """
+    How much the roster's score would grow by adding the char in the given role
+    """
+    def CalcGain(self, roster: common.Roster, char_name: str, role: str, buff_mask: int, loot_mask: int, classes: set) -> float:
+        rc = self.rc
+        buff_score, debuff_score = rc.CalcMaskScore(rc.GetCharBuffMask(char_name, role) & ~buff_mask)
+        gain = buff_score + debuff_score + self.GetCharScore(roster.id, char_name, role)
+        gain = gain + self.misc["item-covered"] * bin(rc.GetCharLootMask(char_name) & ~loot_mask).count("1")
+        if rc.chars[char_name]["class"] in classes:
+            gain = gain + self.misc["same-" + role]
+        return gain
+
+    def OrderCandidates(self, roster: common.Roster, kind: int, candidates: "list[str]"):
+        rc = self.rc
+        role = FeasibleSampler.kind_roles[kind]
+        buff_mask = rc.GetBuffCoverageMask(roster)
+        loot_mask = rc.GetLootCoverageMask(roster)
+        classes = {rc.chars[c]["class"] for c in roster.GetCharsByRole(role)} if role != "dps" else set()
+        gains = [self.CalcGain(roster, c, role, buff_mask, loot_mask, classes) for c in candidates]
+
+        if self.temperature <= 0:
+            order = sorted(range(0, len(candidates)), key=lambda j : (-gains[j], random.random()))
+            for j in order:
+                yield candidates[j]
+            return
+
+        best = max(gains, default=0)
+        weights = [math.exp((g - best) / self.temperature) for g in gains]
+        candidates = list(candidates)
+        while candidates:
+            j = random.choices(range(0, len(candidates)), weights)[0]
+            candidates[j], candidates[-1] = candidates[-1], candidates[j]
+            weights[j], weights[-1] = weights[-1], weights[j]
+            weights.pop()
+            yield candidates.pop()
+
+class GeneticOptimizer:
+
+    """
+    Evolves a population of roster sets, one island per process. Children take whole rosters or role groups from two parents,
+    and then are repaired by the sampler, which drops chars taken twice or alts of the same player and fills the slots left.
+    Some of them are mutated with a random swap. The best individuals of each island are sent to the next one every few generations.
+    """
+    def __init__(self, rm: RosterMaster, rc: RosterChecker, sampler: FeasibleSampler, population_size: int, mutation_rate: float,
+                 migration_interval: int, migrants: int, inbox = None, outbox = None):
+        self.rm = rm
+        self.rc = rc
+        self.sampler = sampler
+        self.population_size = max(population_size, 2)
+        self.mutation_rate = mutation_rate
+        self.migration_interval = migration_interval
+        self.migrants = migrants
+        self.inbox = inbox
+        self.outbox = outbox
+        self.elites = max(1, self.population_size // 20)
+
+    def CreateIndividual(self, rosters: common.RosterSet) -> dict:
+        score, iscores = self.rc.CalcViabilityScoreAlt(rosters)
+        return {"rosters" : rosters, "score" : score, "iscores" : iscores}
+
+    """
+    Returns the best top_amount different individuals found, from best to worst. The first one has the score convergence history
+    """
+    def Evolve(self, progress: "Progress", top_amount: int, samples: int = 20) -> "list[dict]":
+        population = [self.CreateIndividual(self.sampler.Sample()) for j in range(0, self.population_size)]
+        population.sort(key=lambda x : x["score"], reverse=True)
+        best = population[0]
+
+        # Score convergence. List of (seconds, iteration, best score)
+        history = [(0, 0, best["score"])]
+        sample = 1
+        generation = 0
+        i = 0
+        while progress.Continue(i, best):
+            keys = set()
+            children = []
+            for ind in population[:self.elites]:
+                keys.add(common.Roster.GetSetKey(ind["rosters"]))
+                children.append(ind)
+
+            while len(children) < self.population_size and progress.Continue(i, best):
+                child = self.Crossover(self.Select(population), self.Select(population))
+                if random.random() < self.mutation_rate:
+                    self.Mutate(child)
+
+                # Duplicates make the population converge too early. They're replaced by new random individuals
+                key = common.Roster.GetSetKey(child["rosters"])
+                if key in keys:
+                    profiling.Count("rm.ga_duplicates")
+                    child = self.CreateIndividual(self.sampler.Sample())
+                    key = common.Roster.GetSetKey(child["rosters"])
+                keys.add(key)
+                children.append(child)
+                i = i + 1
+                profiling.Count("rm.roster_sets")
+                if child["score"] == 0:
+                    profiling.Count("rm.invalid_roster_sets")
+
+                if child["score"] > best["score"]:
+                    best = child
+                if progress.GetFraction(i) >= sample / samples:
+                    history.append((progress.GetElapsed(), i, best["score"]))
+                    sample = sample + 1
+
+            population = children
+            generation = generation + 1
+            if generation % self.migration_interval == 0:
+                self.Migrate(population)
+            population.sort(key=lambda x : x["score"], reverse=True)
+            best = max(best, population[0], key=lambda x : x["score"])
+
+        results = []
+        keys = set()
+        for ind in [best] + population:
+            key = common.Roster.GetSetKey(ind["rosters"])
+            if key not in keys:
+                keys.add(key)
+                results.append({"rosters" : [r.Copy() for r in ind["rosters"]], "score" : ind["score"], "iscores" : ind["iscores"]})
+            if len(results) == top_amount:
+                break
+        results[0]["history"] = history
+        return results
+
+    """
+    Tournament selection between a few random individuals
+    """
+    def Select(self, population: "list[dict]", size: int = 3) -> dict:
+        return max(random.sample(population, min(size, len(population))), key=lambda x : x["score"])
+
+    """
+    Takes each roster, or each role group of a roster, from one of the parents. Conflicts are dropped and the slots left are filled again
+    """
+    def Crossover(self, a: dict, b: dict) -> dict:
+        parents = [{r.id : r for r in a["rosters"]}, {r.id : r for r in b["rosters"]}]
+        by_group = random.random() < 0.5
+
+        genes = [] # List of (roster index, char name, role)
+        for i in range(0, len(self.rm.signups)):
+            parent = random.choice(parents)
+            for role in common.WoW.roles:
+                if by_group:
+                    parent = random.choice(parents)
+                if i in parent:
+                    genes.extend([(i, c, role) for c in parent[i].GetCharsByRole(role)])
+        random.shuffle(genes)
+
+        sampler = self.sampler
+        rosters = common.RosterSet([common.Roster(s, self.rm.chars, self.rm.tmb, id) for id, s in enumerate(self.rm.signups)])
+        sampler.Reset(rosters)
+        for i, c, role in genes:
+            if not sampler.Keep(rosters, i, c, role):
+                profiling.Count("rm.ga_repairs")
+        sampler.Fill(rosters)
+        return self.CreateIndividual(rosters)
+
+    """
+    Applies a random swap to the individual, unless it makes it invalid
+    """
+    def Mutate(self, ind: dict, max_tries: int = 10):
+        state = ScoreState(self.rc, ind["rosters"])
+        for j in range(0, max_tries):
+            undo = self.rm.DoRandomMove(state)
+            if undo:
+                score, iscores = state.GetScore()
+                if score > 0 or ind["score"] == 0:
+                    break
+                undo()
+
+        ind["score"], ind["iscores"] = self.rc.CalcViabilityScoreAlt(ind["rosters"])
+
+    """
+    Sends the best individuals to the next island and replaces the worst ones with the individuals received
+    """
+    def Migrate(self, population: "list[dict]"):
+        if self.outbox is not None:
+            population.sort(key=lambda x : x["score"], reverse=True)
+            for ind in population[:self.migrants]:
+                self.outbox.put([r.Encode() for r in ind["rosters"]])
+
+        if self.inbox is not None:
+            rm = self.rm
+            while True:
+                try:
+                    encoding = self.inbox.get_nowait()
+                except Empty:
+                    break
+
+                rosters = common.RosterSet([common.Roster.Decode(e, rm.signups, rm.chars, rm.tmb) for e in sorted(encoding)])
+                population.sort(key=lambda x : x["score"], reverse=True)
+                population[-1] = self.CreateIndividual(rosters)
+                profiling.Count("rm.ga_migrants")
+
+class TopResults:
+
+    """
+    Keeps the best k results seen so far in a min-heap. Everything else is discarded.
+    """
+    def __init__(self, k: int):
+        self.k = k
+        self.heap = [] # (score, insertion order, result)
+        self.count = 0
+        self.keys = {} # K = Insertion order, V = Roster set key. Used to skip duplicates
+
+    def IsCandidate(self, score):
+        return len(self.heap) < self.k or score > self.heap[0][0]
+
+    def Push(self, res: dict):
+        if not self.IsCandidate(res["score"]):
+            return
+        
+        key = common.Roster.GetSetKey(res["rosters"])
+        if key in self.keys.values():
+            return
+        
+        entry = (res["score"], self.count, res)
+        self.keys[self.count] = key
+        self.count = self.count + 1
+        if len(self.heap) < self.k:
+            heapq.heappush(self.heap, entry)
+        else:
+            _, count, _ = heapq.heapreplace(self.heap, entry)
+            self.keys.pop(count)
+
+    def GetBest(self) -> dict:
+        if len(self.heap) == 0:
+            return None
+        return max(self.heap, key=lambda x : (x[0], -x[1]))[2]
+
+    """
+    Returns the results from best to worst
+    """
+    def GetResults(self) -> list:
+        return [res for _, _, res in sorted(self.heap, key=lambda x : (-x[0], x[1]))]
+
+class Progress:
+
+    """
+    Tells a worker when to stop, either after a given amount of iterations or at a deadline.
+    If a queue is given, the worker's best result so far is sent through it every interval seconds.
+    """
+    def __init__(self, iterations: int, deadline: float = None, queue = None, worker: int = 0, interval: float = 2):
+        self.iterations = iterations
+        self.deadline = deadline
+        self.queue = queue
+        self.worker = worker
+        self.interval = interval
+
+        self.start = time.time()
+        self.last_report = self.start
+
+    def Continue(self, i: int, best: dict = None) -> bool:
+        now = time.time()
+        if self.queue is not None and now - self.last_report >= self.interval:
+            self.Report(i, best)
+            self.last_report = now
+
+        if self.deadline is not None:
+            return now < self.deadline
+        return i < self.iterations
+    
+    """
+    Fraction of the work done, from 0 to 1
+    """
+    def GetFraction(self, i: int) -> float:
+        if self.deadline is not None:
+            return min((time.time() - self.start) / max(self.deadline - self.start, 1e-9), 1)
+        return i / self.iterations if self.iterations > 0 else 1
+    
+    def GetElapsed(self) -> float:
+        return time.time() - self.start
+
+    def Report(self, i: int, best: dict = None):
+        msg = {"worker" : self.worker, "iterations" : i, "elapsed" : self.GetElapsed(), "score" : 0, "iscores" : [], "rosters" : None}
+        if best:
+            msg["score"] = best["score"]
+            msg["iscores"] = best["iscores"]
+            msg["rosters"] = [r.Encode() for r in best["rosters"]]
+        self.queue.put(msg)
+
+class ExactSolver:
+
+    """
+    Branch and bound search over rosters with 2 tanks, 2 healers and 6 dps.
+    Slots are filled in order: tanks, healers and then dps of every roster.
+    """
+    def __init__(self, rm: RosterMaster, rc: RosterChecker, time_limit: float):
+        self.rm = rm
+        self.rc = rc
+        self.time_limit = time_limit
+
+    def Solve(self, incumbent: dict = None):
+        rc = self.rc
+        self.rosters = [common.Roster(s, self.rm.chars, self.rm.tmb, id) for id, s in enumerate(self.rm.signups)]
+        self.rosters.sort(key=lambda x : len(x.signup.GetActivePlayers()))
+        self.states = [RosterScoreState(rc, r) for r in self.rosters]
+
+        # Slots to fill. K = Slot index, V = (roster index, role)
+        amounts = {"tank" : 2, "healer" : 2, "dps" : 6}
+        self.slots = []
+        for role in common.WoW.roles:
+            for i in range(0, len(self.rosters)):
+                self.slots = self.slots + [(i, role)] * amounts[role]
+
+        # Remaining slots per roster and role, after slot index
+        self.remaining = []
+        for slot in range(0, len(self.slots) + 1):
+            remaining = [{role : 0 for role in common.WoW.roles} for r in self.rosters]
+            for i, role in self.slots[slot:]:
+                remaining[i][role] = remaining[i][role] + 1
+            self.remaining.append(remaining)
+
+        # Candidates per roster and role, best char score first. Ties keep the order of the characters db
+        self.terms = {} # K = (roster index, char name, role), V = Char score + rating
+        self.candidates = {} # K = (roster index, role), V = Char names
+        for i, state in enumerate(self.states):
+            for role in common.WoW.roles:
+                for c, char in self.rosters[i].signup.GetActiveCharsByRole(role).items():
+                    rating = 0
+                    if role != "dps":
+                        rating = rc.GetCharRating(char, role)
+                    self.terms[(i, c, role)] = state.CalcCharScore(char, role) + rating
+                self.candidates[(i, role)] = sorted(self.rosters[i].signup.GetActiveCharsByRole(role), key=lambda c : (-self.terms[(i, c, role)], self.rm.chars.GetCharId(c)))
+
+        # What each candidate brings to the bound. K = (roster index, role), V = (Char name, discord id, term, buff mask, loot mask, soaker)
+        self.options = {}
+        for (i, role), candidates in self.candidates.items():
+            self.options[(i, role)] = [(c, self.rm.chars[c]["discord_id"], self.terms[(i, c, role)], rc.GetCharBuffMask(c, role), rc.GetCharLootMask(c),
+                                        RosterScoreState.IsSoaker(self.rm.chars[c], role)) for c in candidates]
+        self.mask_scores = {} # K = Buff mask, V = Buff + debuff score
+        self.previous = self.GetPreviousEquivalents()
+
+        self.used = set()
+        self.best = {"rosters" : None, "score" : 0, "iscores" : []}
+        if incumbent:
+            self.best = incumbent
+        self.open_bound = 0
+        self.nodes = 0
+        self.timed_out = False
+        self.deadline = time.time() + self.time_limit
+
+        self.Search(0, 0)
+
+        upper_bound = max(self.best["score"], self.open_bound) if self.timed_out else self.best["score"]
+        result = dict(self.best)
+        result["optimal"] = not self.timed_out
+        result["upper_bound"] = upper_bound
+        result["gap"] = upper_bound - self.best["score"]
+        result["nodes"] = self.nodes
+        return result
+
+    """
+    Chars that score the same in every roster and role are interchangeable. Only the first free one of them is tried,
+    so the same rosters aren't explored once per permutation. Chars of players with alts are never interchangeable
+    """
+    def GetPreviousEquivalents(self) -> dict:
+        rc = self.rc
+        previous = {} # K = Char name, V = Last interchangeable char before it in the db
+        last = {} # K = Signature, V = Char name
+        for c, char in self.rm.chars.items():
+            if len(self.rm.chars.FindCharacters(char["discord_id"])) > 1:
+                continue
+
+            signature = [char["class"], rc.GetCharLootMask(c)]
+            for role in common.WoW.roles:
+                signature.append(rc.GetCharBuffMask(c, role))
+                signature.append(RosterScoreState.IsSoaker(char, role))
+                for i in range(0, len(self.rosters)):
+                    signature.append(self.terms.get((i, c, role)))
+            signature = tuple(signature)
+
+            if signature in last:
+                previous[c] = last[signature]
+            last[signature] = c
+        return previous
+
+    def Search(self, slot: int, start: int):
+        self.nodes = self.nodes + 1
+
+        # All slots are filled
+        if slot == len(self.slots):
+            iscores = [s.CalcScore() for s in self.states]
+            score = ExactSolver.HarmonicMean(iscores)
+            if score > self.best["score"]:
+                score, iscores = self.rc.CalcViabilityScoreAlt(self.rosters)
+                self.best = {"rosters" : [r.Copy() for r in self.rosters], "score" : score, "iscores" : iscores}
+            return
+        
+        bound = self.CalcBound(slot)
+        if bound <= self.best["score"]:
+            return
+        
+        if time.time() > self.deadline:
+            self.timed_out = True
+        if self.timed_out:
+            self.open_bound = max(self.open_bound, bound)
+            return
+
+        i, role = self.slots[slot]
+        state = self.states[i]
+        same_group = slot + 1 < len(self.slots) and self.slots[slot + 1] == (i, role)
+        candidates = self.candidates[(i, role)]
+        for k in range(start, len(candidates)):
+            c = candidates[k]
+            if c in self.used or state.player_counts.get(self.rm.chars[c]["discord_id"], 0) > 0:
+                continue
+
+            # Picking an interchangeable char while an earlier one is still free leads to the same scores
+            if c in self.previous and self.previous[c] not in self.used:
+                continue
+
+            self.used.add(c)
+            self.rosters[i].RosterChar(c, role)
+            state.Add(c, role)
+
+            # Once the time is up, children only add their bound to the open one
+            self.Search(slot + 1, k + 1 if same_group else 0)
+
+            state.Remove(c, role)
+            self.rosters[i].UnrosterChar(c)
+            self.used.remove(c)
+            
+    """
+    Upper bound of the global score that can be reached from the current partial rosters
+    """
+    def CalcBound(self, slot: int):
+        bases = []
+        gains = []
+        best_gains = {} # K = Char name, V = Best gain of this char in any roster
+        for i, state in enumerate(self.states):
+            base, gain = self.CalcRosterBound(i, state, self.remaining[slot][i], best_gains)
+            if base + gain <= 0:
+                return 0
+            bases.append(base)
+            gains.append(gain)
+
+        # Each char can only be in one roster, so the gains of all the rosters together are capped too
+        left = len(self.slots) - slot
+        if len(best_gains) < left:
+            return 0
+        total = sum(sorted(best_gains.values(), reverse=True)[:left])
+
+        return ExactSolver.FillBounds(bases, gains, total)
+
+    """
+    Returns the score of the roster without the empty slots and an upper bound of what filling them adds to it.
+    Every free char adds at most its score plus the buffs and items nobody in the roster covers yet
+    """
+    def CalcRosterBound(self, i: int, state: RosterScoreState, remaining: dict, best_gains: dict):
+        if sum(remaining.values()) == 0:
+            return state.CalcScore(), 0
+        
+        rc = self.rc
+        r = self.rosters[i]
+        misc = rc.raid_comp_data["misc"]
+
+        role_gains = 0
+        player_gains = {} # K = Discord id, V = Best gain of this player in any role
+        terms = 0
+        items = 0
+        buffs = 0
+        buff_mask = 0
+        loot_mask = 0
+        has_soaker = state.soakers > 0
+        for role, amount in remaining.items():
+            if amount == 0:
+                continue
+
+            # Chars for this role which are still available
+            gains = []
+            char_items = []
+            char_buffs = []
+            for c, discord_id, term, char_buff_mask, char_loot_mask, soaker in self.options[(i, role)]:
+                if c in self.used or state.player_counts.get(discord_id, 0) > 0:
+                    continue
+                
+                # Candidates are sorted by char score, so the first ones have the best terms
+                if len(gains) < amount:
+                    terms = terms + term
+
+                char_buff_mask = char_buff_mask & ~state.buff_mask
+                char_loot_mask = char_loot_mask & ~state.loot_mask
+                char_items.append(bin(char_loot_mask).count("1"))
+                char_buffs.append(self.CalcMaskScore(char_buff_mask))
+                gain = term + misc["item-covered"] * char_items[-1] + char_buffs[-1]
+                gains.append(gain)
+                player_gains[discord_id] = max(player_gains.get(discord_id, gain), gain)
+                best_gains[c] = max(best_gains.get(c, gain), gain)
+
+                buff_mask |= char_buff_mask
+                loot_mask |= char_loot_mask
+                has_soaker = has_soaker or soaker
+
+            if len(gains) < amount:
+                return 0, 0
+            role_gains = role_gains + sum(sorted(gains, reverse=True)[:amount])
+            items = items + sum(sorted(char_items, reverse=True)[:amount])
+            buffs = buffs + sum(sorted(char_buffs, reverse=True)[:amount])
+            
+        if r.signup.RequiresSoaker() and not has_soaker:
+            return 0, 0
+
+        # Each player can only fill one slot
+        left = sum(remaining.values())
+        if len(player_gains) < left:
+            return 0, 0
+        player_gains = sum(sorted(player_gains.values(), reverse=True)[:left])
+
+        # Items and buffs can't be covered twice, nor by more chars than the slots left
+        items = min(items, bin(loot_mask).count("1"))
+        buffs = min(buffs, self.CalcMaskScore(buff_mask))
+        gain = min(role_gains, player_gains, terms + misc["item-covered"] * items + buffs)
+
+        base = 1000 + misc["item-covered"] * bin(state.loot_mask).count("1") + state.char_score + state.rating_score
+        if r.signup.RequiresMotalStrike():
+            base = base + misc["mortal-strike-covered"]
+
+        # Same class penalties are only known once both chars are in
+        for role, penalty in [("healer", misc["same-healer"]), ("tank", misc["same-tank"])]:
+            chars = r.GetCharsByRole(role)
+            if len(chars) > 1:
+                if rc.chars[chars[0]]['class'] == rc.chars[chars[1]]['class']:
+                    base = base + penalty
+            else:
+                base = base + max(penalty, 0)
+
+        return base + self.CalcMaskScore(state.buff_mask), gain
+    
+    def CalcMaskScore(self, mask: int):
+        if mask not in self.mask_scores:
+            self.mask_scores[mask] = sum(self.rc.CalcMaskScore(mask))
+        return self.mask_scores[mask]
+
+    """
+    Highest harmonic mean of the base scores when each one can grow up to its gain, but all of them together only up to total.
+    The lowest scores are raised first, as that's what increases the harmonic mean the most
+    """
+    def FillBounds(bases: list, gains: list, total: float):
+        if sum(gains) <= total:
+            return ExactSolver.HarmonicMean([b + g for b, g in zip(bases, gains)])
+
+        # Binary search of the level the scores are raised to. The higher end always uses more than total, so it's an upper bound
+        low = min(bases)
+        high = max([b + g for b, g in zip(bases, gains)])
+        for k in range(0, 30):
+            level = (low + high) / 2
+            if sum([min(max(level - b, 0), g) for b, g in zip(bases, gains)]) > total:
+                high = level
+            else:
+                low = level
+        return ExactSolver.HarmonicMean([b + min(max(high - b, 0), g) for b, g in zip(bases, gains)])
+    
+    def HarmonicMean(scores: list):
+        if min(scores) <= 0:
+            return 0
+        return len(scores) / sum([1 / s for s in scores])
+
+"""
+Prints the progress sent by the workers until they're done, saving the best rosters so far to the output file
+"""
+def MonitorWorkers(args, rm: RosterMaster, rc: RosterChecker, async_results, queue) -> list:
+    progress = {} # K = Worker, V = Last progress message
+    best_score = 0
+    while not async_results.ready() or not queue.empty():
+        try:
+            msg = queue.get(timeout=0.5)
+        except Empty:
+            continue
+
+        progress[msg["worker"]] = msg
+        if msg["rosters"] and msg["score"] > best_score:
+            best_score = msg["score"]
+            rosters = [common.Roster.Decode(e, rm.signups, rm.chars, rm.tmb) for e in msg["rosters"]]
+            if rc.AreRostersValid(rosters):
+                rc.SaveRostersToFile(rosters, args.o)
+
+        throughput = ["{:.0f}".format(p["iterations"] / max(p["elapsed"], 1e-9)) for _, p in sorted(progress.items())]
+        elapsed = max([p["elapsed"] for p in progress.values()])
+        print("[{:7.1f}s] Best score: {:.2f} Rosters/sec per thread: {}".format(elapsed, best_score, " ".join(throughput)), flush=True)
+
+    return async_results.get()
+
+def PrintProfile(args):
+    stats = profiling.GetStats()
+    print("Profile (times include nested stages and are added up across threads)")
+    profiling.PrintTable(stats)
+
+    roster_sets = stats["counters"].get("rm.roster_sets", 0)
+    if roster_sets > 0:
+        invalid = stats["counters"].get("rm.invalid_roster_sets", 0)
+        print("Invalid roster sets: {} of {} ({:.2f}%)".format(invalid, roster_sets, invalid * 100 / roster_sets))
+        print()
+    profiling.Save(stats, args.profile_out)
+
+def PrintConvergence(results: list):
+    print("Score convergence")
+    print("{0:<8s}{1:>10s}{2:>12s}{3:>14s}".format("Chain", "Seconds", "Iteration", "Best score"))
+    for i, res in enumerate(results):
+        for seconds, iteration, score in res["history"]:
+            print("{0:<8d}{1:>10.2f}{2:>12d}{3:>14.2f}".format(i, seconds, iteration, score))
+    print()
+
+# Per process data, shared by every job run in it
+worker_rm = None
+worker_rc = None
+worker_queue = None
+worker_migration_queues = None
+
+def LoadData(args):
+    context = GuildContext.FromArgs(args)
+    rm = RosterMaster(context)
+    rc = RosterChecker(context)
+    rc.cache_size = args.cache_size
+    return rm, rc
+
+def Instrument():
+    profiling.Instrument(RosterMaster, ["__init__", "GenerateRandomRosters", "AssignByRole", "GenerateFeasibleRosters", "GenerateWeightedRosters", "GenerateValidRosters", "AnnealRosters", "DoRandomMove"])
+    profiling.Instrument(FeasibleSampler, ["__init__", "CheckFeasibility"])
+    profiling.Instrument(WeightedSampler, ["__init__"])
+    profiling.Instrument(GeneticOptimizer, ["Evolve", "Crossover", "Mutate", "Migrate"])
+    profiling.Instrument(Progress, ["Report"])
+    profiling.Instrument(ExactSolver, ["Solve", "CalcBound"])
+    profiling.Instrument(sys.modules[__name__], ["GenerateRostersInBatches", "MonitorWorkers"], "rm")
+
+    # Requires numpy, which is only needed by --batch
+    try:
+        import batch
+        profiling.Instrument(batch.BatchScorer, ["__init__", "EncodeBlock", "Score"])
+    except ImportError:
+        pass
+    roster_checker.Instrument()
+
+def InitWorker(args, queue, migration_queues = None):
+    global worker_rm, worker_rc, worker_queue, worker_migration_queues
+    if args.profile:
+        profiling.Enable()
+        Instrument()
+    if worker_rm is None:
+        worker_rm, worker_rc = LoadData(args)
+    worker_queue = queue
+
+    # Migrants left in the queues when the run ends are not needed, so exiting doesn't wait for them to be read
+    worker_migration_queues = migration_queues
+    for q in migration_queues or []:
+        q.cancel_join_thread()
+
+"""
+Runs in a worker process. Returns the best results, with rosters encoded by Roster.Encode, and the score cache stats
+"""
+def GenerateRosters(job: dict) -> dict:
+    rm, rc = worker_rm, worker_rc
+    args = job["args"]
+    random.seed(job["seed"])
+    cache_stats = rc.GetCacheStats()
+    profile_stats = profiling.GetStats()
+    progress = Progress(job["iterations"], job["deadline"], worker_queue, job["worker"], args.report_interval)
+
+    if job["algo"] == "anneal":
+        results = [rm.AnnealRosters(rc, job["iterations"], args.t_start, args.t_end, progress=progress)]
+    elif job["algo"] == "ga":
+        results = RunIsland(rm, rc, args, job, progress)
+    elif args.batch > 0:
+        results = GenerateRostersInBatches(rm, rc, progress, args.batch, args.top, args.sampler, args.temperature)
+    else:
+        top = TopResults(args.top)
+        i = 0
+        while progress.Continue(i, top.GetBest()):
+            rosters = rm.SampleRosters(args.sampler, rc, args.temperature)
+            if rosters:
+                score, iscores = rc.CalcViabilityScoreAlt(rosters)
+                profiling.Count("rm.roster_sets")
+                if score == 0:
+                    profiling.Count("rm.invalid_roster_sets")
+                if top.IsCandidate(score):
+                    top.Push({"rosters" : rosters, "score" : score, "iscores" : iscores})
+            i = i + 1
+        results = top.GetResults()
+
+    for res in results:
+        res["rosters"] = [r.Encode() for r in res["rosters"]]
+
+    stats = rc.GetCacheStats()
+    for k in ["hits", "misses"]:
+        stats[k] = stats[k] - cache_stats[k]
+    return {"results" : results, "cache" : stats, "profile" : profiling.Diff(profiling.GetStats(), profile_stats)}
+
+"""
+Runs one island of the genetic optimizer. Migrants go to the next worker's queue, in a ring
+"""
+def RunIsland(rm: RosterMaster, rc: RosterChecker, args, job: dict, progress: "Progress") -> list:
+    inbox, outbox = None, None
+    if worker_migration_queues and len(worker_migration_queues) > 1:
+        inbox = worker_migration_queues[job["worker"]]
+        outbox = worker_migration_queues[(job["worker"] + 1) % len(worker_migration_queues)]
+
+    sampler = rm.GetWeightedSampler(rc, args.temperature) if args.sampler == "weighted" else rm.GetFeasibleSampler()
+    ga = GeneticOptimizer(rm, rc, sampler, args.population, args.mutation_rate, args.migration_interval, args.migrants, inbox, outbox)
+    return ga.Evolve(progress, args.top)
+
+"""
+Rosters are still sampled one set at a time. Only their scoring is done in blocks of batch_size, with numpy
+"""
+def GenerateRostersInBatches(rm: RosterMaster, rc: RosterChecker, progress: Progress, batch_size: int, top_amount: int, sampler: str = "feasible",
+                             temperature: float = 50) -> list:
+
+    # Requires numpy
+    import batch
+    scorer = batch.BatchScorer(rc)
+
+    top = TopResults(top_amount)
+    i = 0
+    while progress.Continue(i, top.GetBest()):
+        size = batch_size if progress.deadline is not None else min(batch_size, progress.iterations - i)
+        block = [rm.SampleRosters(sampler, rc, temperature) for j in range(0, size)]
+        scores, _ = scorer.Score(scorer.EncodeBlock(block))
+        profiling.Count("rm.roster_sets", len(block))
+        profiling.Count("rm.invalid_roster_sets", int((scores == 0).sum()))
+
+        # Only winners are scored again, to get the exact same numbers as the checker
+        for rosters, score in zip(block, scores):
+            if top.IsCandidate(score):
+                score, iscores = rc.CalcViabilityScoreAlt(rosters)
+                top.Push({"rosters" : rosters, "score" : score, "iscores" : iscores})
+        i = i + size
+
+    return top.GetResults()
+
+def SolveExact(args, rm: RosterMaster, rc: RosterChecker, incumbent: dict = None):
+    solver = ExactSolver(rm, rc, args.time_limit)
+    res = solver.Solve(incumbent)
+    if res["optimal"]:
+        print("Found optimal rosters after exploring {} nodes. Gap: {:.2f}".format(res["nodes"], res["gap"]))
+    else:
+        print("Time limit reached after exploring {} nodes. Upper bound: {:.2f} Gap: {:.2f}".format(res["nodes"], res["upper_bound"], res["gap"]))
+
+    rosters = res["rosters"]
+    if rosters and rc.AreRostersValid(rosters):
+        rc.CheckRosters(rosters)
+        rc.SaveRostersToFile(rosters, args.o)
+    else:
+        print("Rosters were not valid! There are not enough players to make 3 raids!")
+
+"""
+Runs algo in -j worker processes. Returns their results sorted by score, without duplicates, or None if interrupted
+"""
+def RunWorkers(args, rm: RosterMaster, rc: RosterChecker, algo: str) -> list:
+
+    # Workers inherit these when forked. Otherwise they're loaded by InitWorker
+    global worker_rm, worker_rc
+    worker_rm, worker_rc = rm, rc
+
+    # Multiprocess generation
+    iterations = args.i
+    threads_amount = args.j
+    seed = args.seed if args.seed is not None else random.randrange(0, 2**32)
+    deadline = time.time() + args.time_budget if args.time_budget else None
+    jobs = []
+    for i in range(0, threads_amount):
+        workload = int(iterations / threads_amount) + (1 if i < iterations % threads_amount else 0)
+        jobs.append({"worker" : i, "seed" : seed + i, "iterations" : workload, "deadline" : deadline, "algo" : algo, "args" : args})
+    if deadline:
+        print("Each thread will generate rosters for {} seconds. Seed: {}".format(args.time_budget, seed))
+    else:
+        print("Each thread will generate: {} rosters. Seed: {}".format([job["iterations"] for job in jobs], seed))
+
+    ctx = multiprocessing.get_context(args.start_method)
+    if ctx.get_start_method() == "fork":
+        rm.context.Share()
+    queue = ctx.Queue()
+    migration_queues = [ctx.Queue() for i in range(0, threads_amount)] if algo == "ga" else None
+    pool = ctx.Pool(threads_amount, initializer=InitWorker, initargs=(args, queue, migration_queues))
+    try:
+        results = MonitorWorkers(args, rm, rc, pool.map_async(GenerateRosters, jobs), queue)
+    except KeyboardInterrupt:
+        pool.terminate()
+        print()
+        print("Interrupted! The best rosters found so far were saved to {}".format(args.o))
+        return None
+    pool.close()
+    pool.join()
+
+    # Rebuild rosters of the winners, skipping the ones found by several threads
+    fresults = []
+    keys = set()
+    hits = 0
+    misses = 0
+    for job_results in results:
+        profiling.Merge(job_results["profile"])
+        hits = hits + job_results["cache"]["hits"]
+        misses = misses + job_results["cache"]["misses"]
+        for res in job_results["results"]:
+            res["rosters"] = [common.Roster.Decode(e, rm.signups, rm.chars, rm.tmb) for e in res["rosters"]]
+            key = common.Roster.GetSetKey(res["rosters"])
+            if key not in keys:
+                keys.add(key)
+                fresults.append(res)
+
+    if hits + misses > 0:
+        print("Score cache hits: {} misses: {} hit rate: {:.2f}%".format(hits, misses, hits * 100 / (hits + misses)))
+
+    fresults.sort(key=lambda x : x['score'], reverse=True)
+    return fresults
+
 def main():
 
     parser = argparse.ArgumentParser(prog='RosterMaster', description='Creates a somewhat viable roster taking loot into account', epilog='Call with --help to find a list of available commands')
@@ -82,58 +1347,78 @@ def main():
     parser.add_argument("-o", default="out.txt")
     parser.add_argument("-i", default=10000, type=int)
     parser.add_argument("-j", default=8, type=int)
+    parser.add_argument("--seed", default=None, type=int, help="Base seed. Each thread uses seed + thread index")
+    parser.add_argument("--start-method", default=None, choices=multiprocessing.get_all_start_methods())
+    parser.add_argument("--top", default=5, type=int, help="Amount of best rosters each thread keeps and that are printed")
+    parser.add_argument("--cache-size", default=100000, type=int, help="Max amount of roster scores each thread keeps in memory")
+    parser.add_argument("--input-cache", default=None, help="File where parsed inputs are kept between runs. Defaults to a file in ~/.cache/rostermaster. "
+                        "It's a pickle, which can run arbitrary code when loaded, so only use files written by yourself")
+    parser.add_argument("--no-input-cache", action="store_true", help="Parse every input from scratch")
+    parser.add_argument("--time-budget", default=None, type=float, help="Generate rosters for this amount of seconds instead of -i iterations")
+    parser.add_argument("--report-interval", default=2, type=float, help="Seconds between progress reports of each thread")
+    parser.add_argument("--profile", action="store_true", help="Print how much time was spent on each stage")
+    parser.add_argument("--profile-out", default="profile.json")
+    parser.add_argument("--batch", default=0, type=int, help="Score random rosters in blocks of this size. Rosters are still sampled one by one. Requires numpy")
+    parser.add_argument("--algo", default="random", choices=["random", "anneal", "exact", "ga"])
+    parser.add_argument("--sampler", default="feasible", choices=["feasible", "weighted", "uniform"], help="How --algo random picks chars. feasible only picks chars that keep every roster fillable. weighted also prefers chars that add more to the score")
+    parser.add_argument("--temperature", default=50, type=float, help="How random --sampler weighted is. Lower values prefer the best chars more strongly, 0 always tries the best char first")
+    parser.add_argument("--t-start", default=100, type=float, help="Starting temperature for --algo anneal")
+    parser.add_argument("--t-end", default=1, type=float, help="Final temperature for --algo anneal")
+    parser.add_argument("--time-limit", default=60, type=float, help="Time limit in seconds for --algo exact. Proving the rosters are optimal is only feasible for small guilds. "
+                        "Otherwise the best rosters found are printed along with the gap to the upper bound of the score")
+    parser.add_argument("--exact-seed", default="anneal", choices=["random", "anneal", "ga"], help="Algorithm run by the -j threads to find the starting rosters of --algo exact")
+    parser.add_argument("--population", default=50, type=int, help="Roster sets per island for --algo ga")
+    parser.add_argument("--mutation-rate", default=0.3, type=float, help="Chance of each child getting a random swap for --algo ga")
+    parser.add_argument("--migration-interval", default=10, type=int, help="Generations between migrations for --algo ga")
+    parser.add_argument("--migrants", default=2, type=int, help="Best roster sets each island sends to the next one for --algo ga")
     args = parser.parse_args()
 
     logging.basicConfig(format='%(levelname)s: %(message)s', level=logging.INFO)
-    rm = RosterMaster(args.characters_db, args.tmb_file, args.contested_items, args.sfp)
-    rc = RosterChecker(args.raid_comp_data, args.characters_db, args.inactive_chars, args.tmb_file, args.contested_items, args.sfp)
-
-    # Multithreaded generation
-    mgr = multiprocessing.Manager()
-    lock = mgr.Lock()
-    results = mgr.list()
-    def GenerateRoster(iterations):
-        i_results = []
-        for i in range(0, iterations):
-            rosters = rm.GenerateRandomRosters()
-            if rosters:
-                score, iscores = rc.CalcViabilityScoreAlt(rosters)
-                res = {"rosters" : rosters, "score" : score, "iscores" : iscores}
-                i_results.append(res)
+    if args.profile:
+        profiling.Enable()
+        Instrument()
+    rm, rc = LoadData(args)
 
-        i_results.sort(key=lambda x : x["score"], reverse=True)
-        lock.acquire()
-        for i in range(0, 5):
-            results.append(i_results[i])
-        lock.release()
+    problems = rm.CheckFeasibility()
+    if problems:
+        for problem in problems:
+            logging.error(problem)
+        logging.error("No valid set of rosters can be made for these signups")
+        return
 
-    iterations = args.i
-    threads_amount = args.j
-    
-    threads = []
-    workload = int(iterations / threads_amount)
-    print("Each thread will generate: {} rosters", workload)
-    for i in range(0, threads_amount):
-        thread = multiprocessing.Process(target=GenerateRoster, kwargs={"iterations" : workload})
-        thread.start()
-        threads.append(thread)
+    # Rosters found by the workers are the starting point of --algo exact, so more branches are pruned
+    algo = args.exact_seed if args.algo == "exact" else args.algo
+    results = RunWorkers(args, rm, rc, algo)
+    if results is None:
+        return
 
-    for thread in threads:
-        thread.join()
+    if args.algo == "exact":
+        incumbent = results[0] if results else None
+        if incumbent:
+            incumbent.pop("history", None)
+        SolveExact(args, rm, rc, incumbent)
+        if args.profile:
+            PrintProfile(args)
+        return
+
+    if args.profile:
+        PrintProfile(args)
 
     # Print results
-    fresults = list(results)
-    fresults.sort(key=lambda x : x['score'], reverse=True)
-    print("Top 5")
-    for i in range(0, 5):
+    if args.algo in ["anneal", "ga"]:
+        PrintConvergence([res for res in results if "history" in res])
+
+    print("Top {}".format(args.top))
+    for i in range(0, min(args.top, len(results))):
         print("Rosters ", i)
-        rosters = fresults[i]['rosters']
+        rosters = results[i]['rosters']
         if rc.AreRostersValid(rosters):
             rc.CheckRosters(rosters)
             mode = 'w' if i == 0 else 'a'
             rc.SaveRostersToFile(rosters, args.o, mode)
             print()
-            input("-------------- Press Enter --------------")
+            if not args.time_budget:
+                input("-------------- Press Enter --------------")
         else:
             print("Rosters were not valid! There are not enough players to make 3 raids!")
             break
@@ -1,131 +1,137 @@
 import argparse
-import json
-import math
-
+import cache
 import common
+import profiling
+
+from guild import GuildContext
+
+"""
+Every report of SlackerDetector. Per signup reports are keyed by signup title and only contain titles with at least one player.
+Players are stored as the name of their main char, or their first char if they don't have one.
+"""
+class SlackerReport:
+
+    __slots__ = ["actives_per_signup", "slackers_per_signup", "unavailable_per_signup", "active_players", "inactive_players", "slackers", "active_chars"]
+
+    def __init__(self):
+        self.actives_per_signup = {} # K = Signup title, V = List of players that signed up, including absences
+        self.slackers_per_signup = {} # K = Signup title, V = List of players that didn't sign up
+        self.unavailable_per_signup = {} # K = Signup title, V = List of active players that can't raid that day
+        self.active_players = {} # K = Discord id, V = Player. Players that can raid at least one day
+        self.inactive_players = {} # K = Discord id, V = Player. Players that can't raid any day
+        self.slackers = {} # K = Discord id, V = Player. Core players that haven't quit and didn't sign up for any raid
+        self.active_chars = {} # K = Char name, V = Char. Chars of active players whose spec was signed up for at least one raid
+
+    """
+    Returns the players in (or not in, if included is False) each signup's set, keyed by title, in the same order as the players.
+    Signups sharing a title share their list
+    """
+    def BuildPerSignup(signups: "list[common.Signup]", players: list, sets: list, included: bool) -> dict:
+        reports = {}
+        for discord_id, char_name in players:
+            for s, members in zip(signups, sets):
+                if (discord_id in members) == included:
+                    reports.setdefault(s.title, []).append(char_name)
+        return reports
 
 class SlackerDetector:
 
-    def __init__(self, charDB_file, sfp : str):
-        self.chars = common.CharacterBD(charDB_file)
-        self.signups = common.Signup.LoadSignups(self.chars, sfp)
+    def __init__(self, context: GuildContext):
+        self.context = context
+        self.chars = context.chars
+        self.signups = context.signups
+        self.report = None
 
-    def GetActivesPerSignup(self):
-        actives = {}
-        
+    """
+    Builds every report at once from per signup sets. The context is immutable, so it's only built once
+    """
+    def Detect(self) -> SlackerReport:
+        if self.report:
+            return self.report
+
+        report = SlackerReport()
         signups = self.signups
-        players = self.chars.GetPlayers()
-        for discord_id, char_name in players.items():
-            for s in signups:
-                if s.HasPlayerSignedUp(discord_id):
-                    if s.title in actives:
-                        actives[s.title].append(char_name)
-                    else:
-                        actives[s.title] = [char_name]
-        return actives
+        players = self.chars.players
+
+        # Sets per signup
+        signed = [set(s.players) for s in signups]
+        active = [set(s.active_players) for s in signups]
+        signed_any = set().union(*signed)
+        active_any = set().union(*active)
+        signed_chars = set().union(*[s.signed_chars for s in signups])
+
+        # Same order as the signups list them
+        for s in signups:
+            for discord_id in s.active_players:
+                if discord_id in players:
+                    report.active_players[discord_id] = players[discord_id]
+
+        player_items = list(players.items())
+        active_items = list(report.active_players.items())
+        report.actives_per_signup = SlackerReport.BuildPerSignup(signups, player_items, signed, True)
+        report.slackers_per_signup = SlackerReport.BuildPerSignup(signups, player_items, signed, False)
+        report.unavailable_per_signup = SlackerReport.BuildPerSignup(signups, active_items, active, False)
+
+        for discord_id, char_name in player_items:
+            if discord_id not in active_any:
+                report.inactive_players[discord_id] = char_name
+
+            if discord_id not in signed_any and not self.chars[char_name]["has_quit"] and self.chars.GetMain(discord_id) is not None:
+                report.slackers[discord_id] = char_name
+
+        for discord_id, char_name in active_items:
+            for name, char in self.chars.player_chars[discord_id].items():
+                if name in signed_chars:
+                    report.active_chars[name] = char
+
+        self.report = report
+        return report
+
+    def GetActivesPerSignup(self):
+        return dict(self.Detect().actives_per_signup)
 
     def GetSlackersPerSignup(self):
-        slackers = {}
-        
-        signups = self.signups
-        players = self.chars.GetPlayers()
-        for discord_id, char_name in players.items():
-            for s in signups:
-                if not s.HasPlayerSignedUp(discord_id):
-                    if s.title in slackers:
-                        slackers[s.title].append(char_name)
-                    else:
-                        slackers[s.title] = [char_name]
-        return slackers
-    
+        return dict(self.Detect().slackers_per_signup)
+
     def GetSlackers(self):
-        slackers = self.chars.GetPlayers()
-        
-        signups = self.signups
-        players = self.chars.GetPlayers()
-        for discord_id, char_name in players.items():
-            for s in signups:
-                has_quit = self.chars[char_name]['has_quit']
-                is_core = self.chars.GetMain(discord_id)
-                if (s.HasPlayerSignedUp(discord_id) or has_quit or is_core is None) and discord_id in slackers:
-                    slackers.pop(discord_id)
-        
-        return slackers
+        return dict(self.Detect().slackers)
     
     def GetInactivePlayers(self):
-
-        players = self.chars.GetPlayers()
-        signups = self.signups
-        for s in signups:
-            ap = s.GetActivePlayers()
-            for p in ap:
-                if p in players:
-                    players.pop(p)
-        return players
+        return dict(self.Detect().inactive_players)
     
     def GetActivePlayers(self) -> dict:
-
-        players_db = self.chars.GetPlayers()
-
-        players = {}
-        signups = self.signups
-        for s in signups:
-            ap = s.GetActivePlayers()
-            for id, name in ap.items():
-                players[id] = players_db[id]
-
-        return players
+        return dict(self.Detect().active_players)
     
     def GetUnavailableActivesPerSignup(self) -> dict:
-        
-        unavailable_players = {}
-
-        signups = self.signups
-        players = self.GetActivePlayers()
-        for discord_id, char_name in players.items():
-            for s in signups:
-                if discord_id not in s.active_players:
-                    if s.title in unavailable_players:
-                        unavailable_players[s.title].append(char_name)
-                    else:
-                        unavailable_players[s.title] = [char_name]
-        return unavailable_players
+        return dict(self.Detect().unavailable_per_signup)
     
     def GetActiveChars(self) -> dict:
-        
-        active_chars = {}
-        active_players = self.GetActivePlayers()
-
-        for id, _ in active_players.items():
-            chars = self.chars.FindCharacters(id)
-            for name, char in chars.items():
-                if self.HasCharSignedUp(self.signups, name):
-                    active_chars[name] = char
-
-        return active_chars
-    
-
-    # TODO: Move to common. Then remove from rc and from here
-    def HasCharSignedUp(self, signups: "list[common.Signup]", char: str):
-        for s in signups:
-            char_data = self.chars[char]
-            discord_id = char_data['discord_id']
-            if discord_id in s.active_players:
-                spec = s.active_players[discord_id]['spec']
-                if char_data['spec'] in spec:
-                    return True
-                
-        return False
+        return dict(self.Detect().active_chars)
 
+def Instrument():
+    profiling.Instrument(SlackerDetector, ["__init__", "Detect"])
+    profiling.Instrument(GuildContext, ["__init__"])
+    profiling.Instrument(cache.InputCache, ["__init__", "Save"])
+    profiling.Instrument(common.CharacterBD, ["__init__"])
+    profiling.Instrument(common.Signup, ["__init__"])
 
 def main():
 
     parser = argparse.ArgumentParser(prog='SlcakerDetector', description='Checks for player that didnt sign up', epilog='Call with --help to find a list of available commands')
     parser.add_argument("--characters-db", default="characters-db.csv")
     parser.add_argument("--sfp", default="s%i.json")
+    parser.add_argument("--profile", action="store_true", help="Print how much time was spent on each report")
+    parser.add_argument("--profile-out", default="profile.json")
+    parser.add_argument("--input-cache", default=None, help="File where parsed inputs are kept between runs. Defaults to a file in ~/.cache/rostermaster. "
+                        "It's a pickle, which can run arbitrary code when loaded, so only use files written by yourself")
+    parser.add_argument("--no-input-cache", action="store_true", help="Parse every input from scratch")
     args = parser.parse_args()
 
-    sd = SlackerDetector(args.characters_db, args.sfp)
+    if args.profile:
+        profiling.Enable()
+        Instrument()
+
+    sd = SlackerDetector(GuildContext.FromArgs(args))
     players = sd.GetActivePlayers()
     print("The following players ({}) have signed up for at least one raid this week".format(len(players)))
     for id, name in players.items():
@@ -140,7 +146,6 @@ def main():
             print(char_name)
         print()
 
-    sd = SlackerDetector(args.characters_db, args.sfp)
     chars = sd.GetActiveChars()
     print("These are the active chars ({}) which have signed up for at least one raid this week".format(len(chars)))
     for name, char in chars.items():
@@ -174,5 +179,11 @@ def main():
     for _, slacker in slackers.items():
         print("@{} ".format(sd.chars[slacker]['discord_user']))
 
+    if args.profile:
+        print()
+        stats = profiling.GetStats()
+        profiling.PrintTable(stats)
+        profiling.Save(stats, args.profile_out)
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,155 @@
+import argparse
+import csv
+import json
+import os
+import random
+
+# (Class, Main spec, Main spec role, Offspec, Offspec role)
+SPECS = [
+    ("Paladin", "Protection", "tank", "Retribution", "dps"),
+    ("Paladin", "Holy", "healer", "Retribution", "dps"),
+    ("Paladin", "Retribution", "dps", "Holy", "healer"),
+    ("Warrior", "Protection", "tank", "Fury", "dps"),
+    ("Warrior", "Fury", "dps", "Protection", "tank"),
+    ("Warrior", "Arms", "dps", "", None),
+    ("Druid", "Feral", "tank", "Restoration", "healer"),
+    ("Druid", "Restoration", "healer", "Balance", "dps"),
+    ("Druid", "Balance", "dps", "Restoration", "healer"),
+    ("Death Knight", "Blood", "tank", "Frost", "dps"),
+    ("Death Knight", "Unholy", "dps", "Blood", "tank"),
+    ("Death Knight", "Frost", "dps", "Blood", "tank"),
+    ("Priest", "Discipline", "healer", "Shadow", "dps"),
+    ("Priest", "Holy", "healer", "Shadow", "dps"),
+    ("Priest", "Shadow", "dps", "Discipline", "healer"),
+    ("Shaman", "Restoration", "healer", "Elemental", "dps"),
+    ("Shaman", "Elemental", "dps", "Restoration", "healer"),
+    ("Shaman", "Enhancement", "dps", "Restoration", "healer"),
+    ("Rogue", "Combat", "dps", "", None),
+    ("Rogue", "Assasination", "dps", "", None),
+    ("Mage", "Frost", "dps", "", None),
+    ("Mage", "Fire", "dps", "", None),
+    ("Mage", "Arcane", "dps", "", None),
+    ("Warlock", "Affliction", "dps", "", None),
+    ("Warlock", "Demonology", "dps", "", None),
+    ("Warlock", "Destruction", "dps", "", None),
+    ("Hunter", "Marksmanship", "dps", "", None),
+    ("Hunter", "Survival", "dps", "", None),
+    ("Hunter", "Beast Mastery", "dps", "", None),
+]
+
+TITLES = ["Ulduar Wed", "ToGC Thu", "Ulduar Sun", "Algalon Mon", "ToGC Fri", "Ulduar Sat"]
+
+# Raid helper signup class for each role
+SIGNUP_CLASSES = {"tank" : "Tank", "healer" : "Healer", "dps" : "Dps"}
+
+def GenerateChars(rng: random.Random, char_amount: int) -> list:
+    chars = []
+    player = 0
+    while len(chars) < char_amount:
+        player = player + 1
+        alts = rng.choice([1, 1, 1, 2, 2, 3, 4])
+        for i in range(0, min(alts, char_amount - len(chars))):
+            class_, spec, role, offspec, offspec_role = rng.choice(SPECS)
+            chars.append({"name" : "Char{}".format(len(chars)), "class" : class_, "spec" : spec, "MS" : role, "offspec" : offspec, "OS" : offspec_role,
+                          "is_main" : i == 0, "has_quit" : rng.random() < 0.03, "discord_user" : "player{}".format(player), "discord_id" : str(100000000000 + player)})
+    return chars
+
+def WriteCharsDB(chars: list, filename: str):
+    with open(filename, 'w', newline='') as f:
+        writer = csv.writer(f)
+
+        # 4 header rows. They can't be empty, csv.DictReader would skip them and CharacterBD would skip chars instead
+        writer.writerow(["Characters"])
+        writer.writerow(["Generated by synth.py"])
+        writer.writerow(["Name", "Class", "Spec", "Offspec", "Tank", "Healer", "Dps", "R1", "R2", "R3", "Main", "Quit", "Discord user", "Discord id"])
+        writer.writerow(["", "", "", "", "MS/OS", "MS/OS", "MS/OS"])
+
+        for c in chars:
+            roles = {"tank" : "", "healer" : "", "dps" : ""}
+            roles[c["MS"]] = "MS"
+            if c["OS"]:
+                roles[c["OS"]] = "OS"
+            writer.writerow([c["name"], c["class"], c["spec"], c["offspec"], roles["tank"], roles["healer"], roles["dps"], "", "", "",
+                             "TRUE" if c["is_main"] else "FALSE", "TRUE" if c["has_quit"] else "FALSE", c["discord_user"], c["discord_id"]])
+
+def WriteSignups(rng: random.Random, chars: list, signup_amount: int, filename_pattern: str):
+    players = {}
+    for c in chars:
+        if not c["has_quit"]:
+            players.setdefault(c["discord_id"], []).append(c)
+
+    for i in range(0, signup_amount):
+        signups = []
+        for discord_id, player_chars in players.items():
+            roll = rng.random()
+
+            # Some players don't sign up at all
+            if roll < 0.1:
+                continue
+
+            c = rng.choice(player_chars)
+            signup = "Absence" if roll < 0.25 else "Bench" if roll < 0.3 else SIGNUP_CLASSES[c["MS"]]
+            signups.append({"userid" : discord_id, "class" : signup, "spec" : c["spec"] + rng.choice(["", "1"])})
+
+        data = {"date" : "{}-10-2026".format(i % 28 + 1), "time" : "20:30", "title" : "{} {}".format(TITLES[i % len(TITLES)], i + 1), "signups" : signups}
+        with open(filename_pattern.replace("%i", str(i + 1)), 'w', encoding='utf8') as f:
+            json.dump(data, f)
+
+def WriteLoot(rng: random.Random, chars: list, item_amount: int, contested_items_file: str, tmb_file: str):
+    contested_items = {}
+    tmb = {c["name"] : {"name" : c["name"], "received" : [], "wishlist" : [], "prios" : []} for c in chars}
+    for i in range(0, item_amount):
+        item_id = 45000 + i
+        name = "Item {}".format(item_id)
+        users = rng.sample(chars, min(len(chars), rng.randint(4, 12)))
+
+        # A few chars only appear in the contested items list
+        needed_by = [c["name"] for c in users[:2]]
+        contested_items[str(item_id)] = {"name" : name, "needed_by" : needed_by}
+
+        # Prio orders for an item go from 1 to n, without gaps
+        for order, c in enumerate(users[2:]):
+            received = rng.random() < 0.15
+            entry = {"name" : name, "item_id" : item_id, "pivot" : {"is_received" : 1 if received else 0, "order" : order + 1}}
+            tmb[c["name"]]["wishlist"].append(entry)
+            tmb[c["name"]]["prios"].append(entry)
+            if received:
+                tmb[c["name"]]["received"].append({"name" : name, "item_id" : item_id, "pivot" : {"received_at" : "2026-10-01 20:30:00", "is_offspec" : 0, "officer_note" : None}})
+
+    with open(contested_items_file, 'w') as f:
+        json.dump(contested_items, f, indent=1)
+    with open(tmb_file, 'w') as f:
+        json.dump(list(tmb.values()), f)
+
+def WriteInactiveChars(rng: random.Random, chars: list, filename: str):
+    inactive_chars = {c["name"] : True for c in chars if rng.random() < 0.05}
+    with open(filename, 'w') as f:
+        json.dump(inactive_chars, f, indent=1)
+
+"""
+Writes a synthetic guild to out_dir, with the same file names rc.py, rm.py and sd.py use by default
+"""
+def GenerateGuild(out_dir: str, char_amount: int, signup_amount: int, item_amount: int, seed: int = 0):
+    rng = random.Random(seed)
+    os.makedirs(out_dir, exist_ok=True)
+
+    chars = GenerateChars(rng, char_amount)
+    WriteCharsDB(chars, os.path.join(out_dir, "characters-db.csv"))
+    WriteSignups(rng, chars, signup_amount, os.path.join(out_dir, "s%i.json"))
+    WriteLoot(rng, chars, item_amount, os.path.join(out_dir, "contested-items.json"), os.path.join(out_dir, "character-json.json"))
+    WriteInactiveChars(rng, chars, os.path.join(out_dir, "inactive-chars.json"))
+
+def main():
+
+    parser = argparse.ArgumentParser(prog='Synth', description='Generates synthetic guild data to test and benchmark the other modules', epilog='Call with --help to find a list of available commands')
+    parser.add_argument("-o", default="synth", help="Output directory")
+    parser.add_argument("-c", default=45, type=int, help="Amount of characters")
+    parser.add_argument("-s", default=3, type=int, help="Amount of signups")
+    parser.add_argument("--items", default=20, type=int, help="Amount of contested items")
+    parser.add_argument("--seed", default=0, type=int)
+    args = parser.parse_args()
+
+    GenerateGuild(args.o, args.c, args.s, args.items, args.seed)
+
+if __name__ == "__main__":
+    main()
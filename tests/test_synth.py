@@ -0,0 +1,29 @@
+import json
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import common
+import synth
+
+class SynthTest(unittest.TestCase):
+
+    def test_guild_round_trip(self):
+        with tempfile.TemporaryDirectory() as out_dir:
+            synth.GenerateGuild(out_dir, 60, 3, 10, seed=1)
+
+            char_db = common.CharacterBD(os.path.join(out_dir, "characters-db.csv"))
+            self.assertEqual(list(char_db.chars), ["Char{}".format(i) for i in range(0, 60)])
+
+            players = char_db.GetPlayers()
+            for i in range(1, 4):
+                with open(os.path.join(out_dir, "s{}.json".format(i)), encoding='utf8') as f:
+                    signup = json.load(f)
+                for entry in signup["signups"]:
+                    self.assertIn(entry["userid"], players)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,62 +1,148 @@
 import json
 
+# Bytes read from the export per chunk while streaming
+CHUNK_SIZE = 1 << 16
+
+class Item:
+
+    __slots__ = ["name", "id", "order", "is_received", "received_at", "is_offspec", "officer_note", "updated_prio"]
+
+    def __init__(self, item_json):
+        self.name = item_json["name"]
+        self.id = item_json["item_id"]
+        pivot = item_json.get("pivot", {})
+        self.order = pivot.get("order")
+        self.is_received = pivot.get("is_received")
+        self.received_at = pivot.get("received_at")
+        self.is_offspec = pivot.get("is_offspec")
+        self.officer_note = pivot.get("officer_note")
+        self.updated_prio = 0
+
 class Character:
 
-    def __init__(self, char_json):
+    __slots__ = ["name", "recv", "wishlist", "prios"]
+
+    """
+    Only the items in item_ids are kept, if given
+    """
+    def __init__(self, char_json, item_ids=None):
         self.name = char_json["name"]
-        self.recv = Character.extract_items_info(char_json["received"], ["received_at", "is_offspec", "officer_note"])
-        self.wishlist = Character.extract_items_info(char_json["wishlist"], ["is_received", "order"])
-        self.prios = Character.extract_items_info(char_json["prios"], ["is_received", "order"])
-        self.data = char_json
+        self.recv = Character.extract_items_info(char_json.get("received", []), item_ids)
+        self.wishlist = Character.extract_items_info(char_json.get("wishlist", []), item_ids)
+        self.prios = Character.extract_items_info(char_json.get("prios", []), item_ids)
 
-    def extract_items_info(recv_json, pivot_keys):
-        recv = {}
-        for i in recv_json:
-            item = {"name" : i["name"], "id" : i["item_id"]}
-            for pk in pivot_keys:
-                if pk in i["pivot"]:
-                    item[pk] = i["pivot"][pk]
+    def extract_items_info(items_json, item_ids=None):
+        items = {}
+        for i in items_json:
+            if item_ids is None or i["item_id"] in item_ids:
+                items[i["item_id"]] = Item(i)
+        return items
 
-            recv[i["item_id"]] = item
-        return recv
+"""
+Yields the elements of the top level JSON array in the given file one by one, without reading the whole file at once
+"""
+def StreamJsonArray(json_path):
+    decoder = json.JSONDecoder()
+    with open(json_path, encoding="utf8") as f:
+        buffer = f.read(CHUNK_SIZE).lstrip()
+        if not buffer.startswith("["):
+            raise ValueError("{} is not a JSON array".format(json_path))
 
-def ReadDataFromJson(json_data):
+        pos = 1
+        eof = False
+        while True:
 
-    characters = {}
+            # Skip separators between elements
+            while pos < len(buffer) and buffer[pos] in " \t\r\n,":
+                pos = pos + 1
 
-    res = json.loads(json_data)
+            if pos < len(buffer) and buffer[pos] == "]":
+                return
+
+            # Try to decode the next element, reading more data if it's not complete yet
+            try:
+                if pos >= len(buffer):
+                    raise ValueError("Incomplete element")
+                element, end = decoder.raw_decode(buffer, pos)
+            except ValueError:
+                if eof:
+                    raise ValueError("{} is truncated or malformed".format(json_path))
+                chunk = f.read(CHUNK_SIZE)
+                eof = not chunk
+                buffer = buffer[pos:] + chunk
+                pos = 0
+                continue
+
+            # An element may end right at the end of the buffer, e.g. a number
+            if end == len(buffer) and not eof:
+                chunk = f.read(CHUNK_SIZE)
+                if chunk:
+                    buffer = buffer[pos:] + chunk
+                    pos = 0
+                    continue
+                eof = True
+
+            yield element
+            pos = end
+
+def LoadFromFile(json_path, item_ids=None):
+
+    characters = {}
+    for character in StreamJsonArray(json_path):
+        characters[character["name"]] = Character(character, item_ids)
 
-    for character in res:
-        characters[character["name"]] = (Character(character))
-    
     calculate_update_prios(characters)
 
     return characters
 
-def GetDataFromFile(json_path):
-    return open(json_path).read()
+def BuildPrioIndex(characters, contested_items=None):
+    
+    # K = (Lowercased char name, Item id), V = Prio
+    prios = {}
+    for _, char in characters.items():
+        name = char.name.lower()
+        for item_id, item in char.wishlist.items():
+            key = (name, item_id)
+            if key not in prios and not item.is_received:
+                prios[key] = item.order
+
+    # Fallback to contested items list
+    if contested_items:
+        for id, item in contested_items.items():
+            for char_name in item["needed_by"]:
+                key = (char_name.lower(), int(id))
+                if key not in prios:
+                    prios[key] = 20
+
+    return prios
 
 def calculate_update_prios(characters):
-    
+
+    # K = Item id, V = List of (order, char name, received)
+    items = {}
     for name, char in characters.items():
         for itemId, item in char.prios.items():
-            item["updated_prio"] = get_updated_prio(characters, itemId, char)
+            if item.order is None:
+                item.updated_prio = 0
+                continue
+            items.setdefault(itemId, []).append((item.order, name, itemId in char.recv))
 
-def get_updated_prio(characters, itemId, char):
-    prio = 0
-    if not itemId in char.prios or itemId in char.recv:
-        return prio
-    
-    updated_prio = 1
-    checked_prio = 1
-    while char.prios[itemId]['order'] > checked_prio:
-
-        for name, c in characters.items():
-            if itemId in c.prios:
-                c_prio = c.prios[itemId]["order"]
-                if checked_prio == c_prio and c != char:
-                    if not itemId in c.recv:
-                        updated_prio = updated_prio + 1
-                    checked_prio = checked_prio + 1
-
-    return updated_prio
\ No newline at end of file
+    # Updated prio is 1 + amount of chars before this one which haven't received the item yet
+    for itemId, prios in items.items():
+        prios.sort(key=lambda x : x[0])
+        pending = 0
+        i = 0
+        while i < len(prios):
+
+            # Chars with the same order don't count against each other
+            j = i
+            group_pending = 0
+            while j < len(prios) and prios[j][0] == prios[i][0]:
+                order, name, received = prios[j]
+                characters[name].prios[itemId].updated_prio = 0 if received else pending + 1
+                if not received:
+                    group_pending = group_pending + 1
+                j = j + 1
+
+            pending = pending + group_pending
+            i = j